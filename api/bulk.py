@@ -0,0 +1,185 @@
+"""
+Bounded worker pool shared by the bulk scripts.
+
+Items are pulled from the input lazily and only a couple per worker are in flight at once, so inputs
+of any size are processed in constant memory. A failing item is recorded and the run keeps going.
+Progress prints live throughput, latency percentiles and the error count while the run goes. The
+latencies leave out the time an item spent waiting for the client's rate limiter or a retry backoff,
+so they show how fast the API answers rather than how long the queue is.
+
+A Journal checkpoints the keys of finished items in an append-only file, so a run restarted with
+--resume skips them without making any API calls. Journals live under ~/.foxpass, one per input, and
+are deleted once a run finishes without errors, so only a run that died or failed leaves one behind.
+"""
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import hashlib
+import os
+import sys
+import threading
+import time
+
+import foxpass
+
+REPORT_INTERVAL = 2.0
+# --workers default of every bulk script
+DEFAULT_WORKERS = 16
+JOURNAL_DIR = os.path.join(os.path.expanduser('~'), '.foxpass')
+
+
+class Result:
+    def __init__(self, item, value=None, error=None, seconds=0.0):
+        self.item = item
+        self.value = value
+        self.error = error
+        self.seconds = seconds
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+# Append-only file of completed keys, one per line. Each key is flushed as soon as it is added, and a
+# line cut short by a crash is ignored on load, so the journal never claims unfinished work.
+class Journal:
+    def __init__(self, path, resume=False):
+        self.keys = set()
+        if resume and os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    if line.endswith('\n'):
+                        self.keys.add(line[:-1])
+        self.file = open(path, 'a' if resume else 'w')
+        self.lock = threading.Lock()
+
+    def __contains__(self, key):
+        return key in self.keys
+
+    def add(self, key):
+        with self.lock:
+            self.keys.add(key)
+            self.file.write(key + '\n')
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    # Deletes the journal, called when the run it belongs to is complete
+    def remove(self):
+        self.close()
+        try:
+            os.remove(self.file.name)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Returns the default journal of a script run on `source`, e.g. a CSV file, so every input gets its own
+def journal_path(name, source):
+    digest = hashlib.sha1(os.path.abspath(source).encode()).hexdigest()[:12]
+    return os.path.join(JOURNAL_DIR, '{}-{}.journal'.format(name, digest))
+
+
+# Deletes the journal of a run in which every item succeeded. A run with errors keeps it, so --resume
+# only retries the failed items.
+def finish_journal(journal, errors):
+    if not errors:
+        journal.remove()
+
+
+# Opens the journal of a run. A journal left by an earlier run is continued with resume or replaced
+# with overwrite, and otherwise refused, so it is never truncated by accident.
+def open_journal(path, resume=False, overwrite=False):
+    if not resume and not overwrite and os.path.exists(path) and os.path.getsize(path):
+        sys.exit('{} holds the progress of an earlier run, add --resume to continue it or --overwrite-journal to start over'.format(path))
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    return Journal(path, resume)
+
+
+class Progress:
+    def __init__(self, label='rows', stream=sys.stderr, interval=REPORT_INTERVAL):
+        self.label = label
+        self.stream = stream
+        self.interval = interval
+        self.count = 0
+        self.errors = 0
+        self.skipped = 0
+        self.latencies = []
+        self.started = time.monotonic()
+        self.reported = self.started
+
+    def record(self, result):
+        self.count += 1
+        self.errors += not result.ok
+        self.latencies.append(result.seconds)
+        if time.monotonic() - self.reported >= self.interval:
+            self.report()
+
+    def percentile(self, p):
+        if not self.latencies:
+            return 0.0
+        latencies = sorted(self.latencies)
+        return latencies[min(len(latencies) - 1, int(p / 100.0 * len(latencies)))]
+
+    def report(self, final=False):
+        now = time.monotonic()
+        self.reported = now
+        elapsed = max(now - self.started, 1e-9)
+        print('{}{} {} in {:.1f}s, {:.1f} {}/sec, p50 {:.0f}ms, p99 {:.0f}ms, {} errors{}'.format(
+            'Done: ' if final else '', self.count, self.label, elapsed, self.count / elapsed, self.label,
+            self.percentile(50) * 1000, self.percentile(99) * 1000, self.errors,
+            ', {} already done'.format(self.skipped) if self.skipped else ''), file=self.stream, flush=True)
+
+
+# Runs work(item) and times it, without the time it spent waiting for the rate limiter
+def timed(work, item):
+    began = time.monotonic() - foxpass.waited()
+    try:
+        return Result(item, value=work(item), seconds=time.monotonic() - foxpass.waited() - began)
+    except Exception as err:
+        return Result(item, error=err, seconds=time.monotonic() - foxpass.waited() - began)
+
+
+# Yields the items whose key is not in the journal yet
+def unfinished(items, journal, key, progress=None):
+    for item in items:
+        if key(item) in journal:
+            if progress:
+                progress.skipped += 1
+            continue
+        yield item
+
+
+# Runs work(item) for every item on `workers` threads and yields a Result per item as it completes.
+# With a journal, items already in it are skipped and successful items are added to it.
+def run(items, work, workers=1, progress=None, journal=None, key=None):
+    workers = max(1, workers)
+    if journal is not None:
+        items = unfinished(items, journal, key, progress)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        items = iter(items)
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < workers * 2:
+                try:
+                    pending.add(pool.submit(timed, work, next(items)))
+                except StopIteration:
+                    exhausted = True
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                if journal is not None and result.ok:
+                    journal.add(key(result.item))
+                if progress:
+                    progress.record(result)
+                yield result
+    if progress:
+        progress.report(final=True)
@@ -0,0 +1,81 @@
+"""
+Bulk deactivation shared by the scripts that deactivate many users at once.
+
+The users are deactivated with PUT users/<name>/ on a pool of workers going through the shared
+client's rate limiter. --max-changes is a circuit breaker: when more users would be deactivated
+than it allows, nothing is changed and the script exits with an error, which catches a wrong keep
+list or filter before it locks everyone out. --dry-run prints the users that would be deactivated.
+Every user's result is printed, or written as a CSV report with --report, and the script exits with
+an error when any user could not be deactivated.
+
+Usage:
+deactivate.add_deactivate_args(parser)
+errors = deactivate.deactivate_users(client, usernames, args)
+deactivate.exit_on_errors(errors)
+"""
+
+import csv
+import sys
+
+import bulk
+
+ENDPOINT = 'users/'
+DATA = {'is_active': False}
+REPORT_HEADER = ['username', 'status', 'seconds', 'response']
+
+
+def add_deactivate_args(parser):
+    parser.add_argument('--workers', type=int, default=bulk.DEFAULT_WORKERS, help='Number of users deactivated in parallel')
+    add_max_changes_arg(parser)
+    parser.add_argument('--dry-run', action='store_true', help='Print the users that would be deactivated without changing them')
+    parser.add_argument('--report', help='Write the result for every user to this .csv file')
+
+
+def add_max_changes_arg(parser):
+    parser.add_argument('--max-changes', type=int, help='Refuse to run when more users than this would be deactivated')
+
+
+# Exits before anything is changed when more users would be deactivated than --max-changes allows
+def check_max_changes(count, max_changes):
+    if max_changes is not None and count > max_changes:
+        sys.exit('Refusing to deactivate {} users, --max-changes is {}'.format(count, max_changes))
+
+
+def deactivate_user(client, username):
+    r = client.put(ENDPOINT + username + '/', json=DATA)
+    if not r.ok:
+        raise RuntimeError('Status code: {}'.format(r.status_code))
+    return r.status_code
+
+
+# Deactivates the users and returns the number that failed, see exit_on_errors
+def deactivate_users(client, usernames, args):
+    usernames = list(usernames)
+    check_max_changes(len(usernames), args.max_changes)
+    if args.dry_run:
+        for username in usernames:
+            print('Would deactivate {}'.format(username))
+        return 0
+
+    progress = bulk.Progress('users')
+    results = bulk.run(usernames, lambda username: deactivate_user(client, username), args.workers, progress)
+    if args.report:
+        with open(args.report, 'w', newline='') as out:
+            writer = csv.writer(out)
+            writer.writerow(REPORT_HEADER)
+            for result in results:
+                writer.writerow([result.item, 'deactivated' if result.ok else 'error',
+                                 '{:.3f}'.format(result.seconds), result.value if result.ok else result.error])
+    else:
+        for result in results:
+            if result.ok:
+                print('Deactivated {}'.format(result.item))
+            else:
+                print('Error deactivating user {}. {}'.format(result.item, result.error))
+    return progress.errors
+
+
+# Exits with an error when some users could not be deactivated, so a scheduled run is noticed
+def exit_on_errors(errors):
+    if errors:
+        sys.exit('{} users could not be deactivated'.format(errors))
@@ -0,0 +1,150 @@
+"""
+Reads of the Foxpass directory shared by the scripts that work on users, groups and memberships.
+
+Group member lists are fetched concurrently over the client's connection pool, so indexing every
+membership costs one request per group, in parallel, instead of one serial request per user.
+snapshot() reads users, groups and every membership this way in one pass.
+
+List endpoints that split their results into pages, the way the log endpoints do with numPages, are
+followed one page at a time. The user and group lists are not paged by the API, so each response is
+parsed as it is downloaded when ijson is installed: iterating over a list then holds one record at
+a time, whatever the size of the directory. Without ijson every response is read whole.
+
+Required packages:
+pip install ijson (optional, for lists that don't grow memory)
+
+Usage:
+client = foxpass.client_from_args(args)
+groups = directory.groups(client)
+members = directory.members_by_group(client, [group['name'] for group in groups])
+state = directory.snapshot(client)
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import bulk
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+USERS_ENDPOINT = 'users/'
+GROUPS_ENDPOINT = 'groups/'
+# names the user list uses for fields that are set under another name
+USER_FIELD_ALIASES = {'is_active': 'active'}
+
+
+# Requests a page of a list endpoint, streamed when ijson can parse it as it arrives
+def get_page(client, endpoint, **kwargs):
+    return client.get(endpoint, stream=ijson is not None, **kwargs)
+
+
+# Yields the records of a list response and stores its numPages in `meta`, which a streamed body
+# only reveals once the records before it have been read
+def iter_page(r, meta):
+    if ijson is None:
+        body = r.json()
+        meta['numPages'] = body.get('numPages', 1)
+        yield from body['data']
+        return
+    # requests leaves gzip decoding to urllib3 when the body is read from raw
+    r.raw.decode_content = True
+    builder = None
+    try:
+        for prefix, event, value in ijson.parse(r.raw, use_float=True):
+            if prefix == 'data.item' or prefix.startswith('data.item.'):
+                if builder is None:
+                    builder = ijson.ObjectBuilder()
+                builder.event(event, value)
+                # a record is complete when its own map ends, or at once when it is a plain value
+                if prefix == 'data.item' and event not in ('start_map', 'start_array', 'map_key'):
+                    yield builder.value
+                    builder = None
+            elif prefix == 'numPages' and event == 'number':
+                meta['numPages'] = int(value)
+    finally:
+        r.close()
+
+
+# Yields the records of a list endpoint page by page, raising requests' HTTPError when a request
+# fails. `first` is the response for the first page when the caller already has it, and `meta`
+# receives the number of pages.
+def iter_data(client, endpoint, first=None, meta=None):
+    meta = {} if meta is None else meta
+    r = first if first is not None else get_page(client, endpoint)
+    r.raise_for_status()
+    yield from iter_page(r, meta)
+    for page in range(2, meta.get('numPages', 1) + 1):
+        r = get_page(client, endpoint, params={'page': page})
+        r.raise_for_status()
+        yield from iter_page(r, meta)
+
+
+def get_data(client, endpoint):
+    return list(iter_data(client, endpoint))
+
+
+# The user and group lists come from a snapshot_cache.SnapshotCache when one is given
+def iter_users(client, cache=None):
+    if cache:
+        return cache.iter(client, USERS_ENDPOINT)
+    return iter_data(client, USERS_ENDPOINT)
+
+
+def iter_groups(client, cache=None):
+    if cache:
+        return cache.iter(client, GROUPS_ENDPOINT)
+    return iter_data(client, GROUPS_ENDPOINT)
+
+
+def users(client, cache=None):
+    return list(iter_users(client, cache))
+
+
+def groups(client, cache=None):
+    return list(iter_groups(client, cache))
+
+
+def user_value(user, field):
+    if field in user:
+        return user[field]
+    return user.get(USER_FIELD_ALIASES.get(field))
+
+
+# Returns the usernames in a group
+def group_members(client, group_name):
+    return [member['username'] for member in get_data(client, GROUPS_ENDPOINT + group_name + '/members/')]
+
+
+# Returns {group name: set of usernames}, fetching the groups on `workers` threads
+def members_by_group(client, group_names, workers=bulk.DEFAULT_WORKERS):
+    group_names = list(group_names)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        member_lists = pool.map(lambda name: group_members(client, name), group_names)
+        return {name: set(members) for name, members in zip(group_names, member_lists)}
+
+
+# Returns the usernames that belong to at least one group
+def grouped_usernames(members):
+    return set().union(*members.values())
+
+
+class Snapshot:
+    def __init__(self, users, groups, members):
+        # {username: user}, {group name: group} and {group name: set of usernames}
+        self.users = users
+        self.groups = groups
+        self.members = members
+
+
+# Returns a Snapshot of the whole directory, the user and group lists are fetched side by side
+def snapshot(client, workers=bulk.DEFAULT_WORKERS):
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        user_list = pool.submit(users, client)
+        group_list = pool.submit(groups, client)
+        user_list, group_list = user_list.result(), group_list.result()
+    members = members_by_group(client, [group['name'] for group in group_list], workers)
+    return Snapshot({user['username']: user for user in user_list},
+                    {group['name']: group for group in group_list},
+                    members)
@@ -0,0 +1,242 @@
+"""
+Shared Foxpass API client used by the scripts in this directory.
+
+Every request goes through one pooled keep-alive requests.Session with the API token, base URL and
+gzip encoding set up once, so bulk operations pay for the TCP+TLS handshake once instead of on
+every call.
+
+Requests are paced by a token bucket shared by every thread using the client. The bucket starts at
+--rate and keeps raising it by RATE_INCREASE requests per second every second while requests succeed,
+so it climbs past the starting rate until the API pushes back. On a 429 it halves its rate and
+honours Retry-After, which settles it near the highest sustained rate the API allows. --max-rate
+puts a hard ceiling on it.
+Idempotent calls (GET, PUT, DELETE) are retried with jittered exponential backoff on 429, 5xx and
+connection errors; other calls are only retried on 429, which the API sends before doing any work.
+
+Required packages:
+pip install requests
+
+Usage:
+parser = argparse.ArgumentParser(description='...')
+foxpass.add_api_args(parser)
+args = parser.parse_args()
+client = foxpass.client_from_args(args)
+r = client.get('users/')
+"""
+
+from email.utils import parsedate_to_datetime
+import random
+import threading
+import time
+
+API_URL = 'https://api.foxpass.com/v1/'
+DEFAULT_POOL_SIZE = 16
+DEFAULT_RATE = 50.0
+DEFAULT_MAX_RETRIES = 5
+
+MIN_RATE = 0.5
+# requests per second the rate grows by each second while requests succeed
+RATE_INCREASE = 10.0
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+RETRY_STATUSES = frozenset([500, 502, 503, 504])
+TOO_MANY_REQUESTS = 429
+
+# seconds each thread has spent waiting for the rate limiter or a backoff, see waited()
+_waits = threading.local()
+
+
+# Returns the seconds the calling thread has spent pacing requests rather than sending them, so
+# callers that time their work can leave the wait out
+def waited():
+    return getattr(_waits, 'seconds', 0.0)
+
+
+def pause(wait):
+    began = time.monotonic()
+    wait()
+    _waits.seconds = waited() + time.monotonic() - began
+
+
+# Returns a keep-alive session whose connection pool can serve pool_size threads at once
+def make_session(headers, pool_size=DEFAULT_POOL_SIZE):
+    # imported here so that scripts which only parse arguments or print --help start instantly
+    import requests
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update(headers)
+    return session
+
+
+# Token bucket allowing `rate` requests per second, with bursts of up to one second's worth. The rate
+# grows without limit unless `max_rate` is given.
+class RateLimiter:
+    def __init__(self, rate, max_rate=None):
+        self.max_rate = max_rate
+        self.rate = min(rate, max_rate) if max_rate else rate
+        self.tokens = max(1.0, rate)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    # Blocks until a request may be sent
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now >= self.updated:
+                    self.tokens = min(max(1.0, self.rate), self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+                else:
+                    # paused by a Retry-After
+                    wait = self.updated - now
+            time.sleep(wait)
+
+    # Halves the rate and, when the API said how long to wait, pauses every thread until then
+    def throttled(self, retry_after=None):
+        with self.lock:
+            self.rate = max(MIN_RATE, self.rate / 2)
+            self.tokens = 0
+            if retry_after:
+                self.updated = max(self.updated, time.monotonic() + retry_after)
+
+    # Additive increase: about `rate` requests succeed per second, so each adds RATE_INCREASE / rate
+    def succeeded(self):
+        with self.lock:
+            self.rate += RATE_INCREASE / self.rate
+            if self.max_rate:
+                self.rate = min(self.max_rate, self.rate)
+
+
+# Returns the Retry-After header in seconds, it may be given either as seconds or as an HTTP date
+def retry_after(response):
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+# Full jitter: a random wait between 0 and an exponentially growing cap
+def backoff(attempt):
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+class FoxpassClient:
+    def __init__(self, api_key, api_url=API_URL, pool_size=DEFAULT_POOL_SIZE, rate=DEFAULT_RATE, max_retries=DEFAULT_MAX_RETRIES, max_rate=None):
+        self.api_url = api_url if api_url.endswith('/') else api_url + '/'
+        self.headers = {
+            'Authorization': 'Token ' + api_key,
+            'Accept-Encoding': 'gzip, deflate',
+        }
+        self.pool_size = pool_size
+        self.limiter = RateLimiter(rate, max_rate) if rate else None
+        self.max_retries = max_retries
+        # requests sent so far, retries included
+        self.requests = 0
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._count_lock = threading.Lock()
+
+    # The session is created on first use, so building a client never touches the network. The lock
+    # keeps workers that start together from each building a session of their own.
+    @property
+    def session(self):
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    self._session = make_session(self.headers, self.pool_size)
+        return self._session
+
+    def url(self, endpoint):
+        return self.api_url + endpoint
+
+    # endpoint is relative to the API url, e.g. 'users/' or 'groups/admins/members/'. The last
+    # response is returned once retries run out, so callers keep handling errors as before.
+    # idempotent=True lets read-only POSTs, like log queries, be retried like a GET.
+    def request(self, method, endpoint, idempotent=None, **kwargs):
+        method = method.upper()
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            if self.limiter:
+                pause(self.limiter.acquire)
+            wait = None
+            with self._count_lock:
+                self.requests += 1
+            try:
+                r = self.session.request(method, self.url(endpoint), **kwargs)
+            except OSError:
+                # requests' connection errors and timeouts are OSErrors
+                if not idempotent or attempt >= self.max_retries:
+                    raise
+            else:
+                if r.status_code == TOO_MANY_REQUESTS:
+                    wait = retry_after(r)
+                    if self.limiter:
+                        self.limiter.throttled(wait)
+                elif r.status_code in RETRY_STATUSES and idempotent:
+                    pass
+                else:
+                    if self.limiter:
+                        self.limiter.succeeded()
+                    return r
+                if attempt >= self.max_retries:
+                    return r
+            attempt += 1
+            delay = max(wait or 0, backoff(attempt))
+            pause(lambda: time.sleep(delay))
+
+    def get(self, endpoint, **kwargs):
+        return self.request('GET', endpoint, **kwargs)
+
+    def post(self, endpoint, **kwargs):
+        return self.request('POST', endpoint, **kwargs)
+
+    def put(self, endpoint, **kwargs):
+        return self.request('PUT', endpoint, **kwargs)
+
+    def delete(self, endpoint, **kwargs):
+        return self.request('DELETE', endpoint, **kwargs)
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Adds the API arguments every script takes. Scripts that keep a token in a constant pass it as
+# `api_key`, which makes --api-key optional.
+def add_api_args(parser, api_key=None, api_url=API_URL, key_help='Foxpass API Key, defaults to FOXPASS_API_TOKEN'):
+    if api_key is None:
+        parser.add_argument('--api-key', required=True, help='Foxpass API Key')
+    else:
+        parser.add_argument('--api-key', default=api_key, help=key_help)
+    parser.add_argument('--api-url', default=api_url, help='Foxpass API Url')
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE, help='Requests per second to start at, raised while the API keeps up and halved when it throttles. 0 disables the limiter')
+    parser.add_argument('--max-rate', type=float, help='Never send more than this many requests per second')
+    parser.add_argument('--max-retries', type=int, default=DEFAULT_MAX_RETRIES, help='How many times a throttled or failed request is retried')
+
+
+def client_from_args(args, pool_size=DEFAULT_POOL_SIZE):
+    return FoxpassClient(args.api_key, args.api_url, pool_size, args.rate, args.max_retries, args.max_rate)
@@ -6,68 +6,147 @@ pip install requests
 
 To run:
 python foxpass_copy_group.py --api-key <api_key> --source-group <group_name> --dest-group <group_name>
+
+To sync many groups at once, repeat --pair or list the pairs in a YAML file (requires pip install pyyaml):
+python foxpass_copy_group.py --api-key <api_key> --pair eng:vpn --pair eng:wiki --pair ops:vpn
+python foxpass_copy_group.py --api-key <api_key> --mapping groups.yaml --remove --dry-run
+
+groups.yaml maps each source group to one destination group or a list of them:
+eng: [vpn, wiki]
+ops: vpn
+
+A destination fed by several sources receives the members of all of them. With --remove, members of a
+destination that are in none of its sources are removed from it. Every member list is fetched in
+parallel first, then the additions and removals are applied in parallel.
 """
 import argparse
-import json
 import sys
 
 import requests
 
-URL = 'https://api.foxpass.com/v1/'
+import bulk
+import directory
+import foxpass
+import snapshot_cache
+
 ENDPOINT = 'groups/'
 
 
 def main():
     args = get_args()
-    header = {'Authorization': 'Token ' + args.api_key}
-    source_list = get_group_list(header, args.source_group).json()['data']
-    dest_list = get_group_list(header, args.dest_group).json()['data']
-    update_list = compare_list(source_list, dest_list)
-    if not update_list:
+    client = foxpass.client_from_args(args, pool_size=max(args.workers, foxpass.DEFAULT_POOL_SIZE))
+    sources = destination_sources(get_pairs(args))
+    groups = set(sources).union(*sources.values())
+    try:
+        members = directory.members_by_group(client, sorted(groups), args.workers)
+    except requests.exceptions.HTTPError as err:
+        sys.exit(err)
+    changes = plan_changes(sources, members, args.remove)
+    if not changes:
         print("No users to update")
         return
-    for user_name in update_list:
-        put_group_member(header, args.dest_group, user_name)
+    if args.dry_run:
+        for action, group_name, user_name in changes:
+            print('Would {} {} {} {}'.format(action, user_name, 'to' if action == 'add' else 'from', group_name))
+        return
+    progress = bulk.Progress('changes')
+    for result in bulk.run(changes, lambda change: apply_change(client, *change), args.workers, progress):
+        action, group_name, user_name = result.item
+        if result.ok:
+            print('{} {} {}'.format(user_name, 'added to' if action == 'add' else 'removed from', group_name))
+        else:
+            print('{} failed to {} {}\n{}'.format(user_name, action, group_name, result.error))
+    snapshot_cache.invalidate_lists(client, args.cache_dir)
 
 
 # return the command line arguments
 def get_args():
-    parser = argparse.ArgumentParser(description='List users in Foxpass')
-    parser.add_argument('--api-key', required=True, help='Foxpass API Key')
-    parser.add_argument('--api-url', default=URL, help='Foxpass API Url')
-    parser.add_argument('--source-group', required=True, help='Source group name')
-    parser.add_argument('--dest-group', required=True, help='Destination group name')
-    return parser.parse_args()
-
-
-# return a list of users in a given group
-def get_group_list(header, group_name):
-    args = get_args()
+    parser = argparse.ArgumentParser(description='Copy or sync members between Foxpass groups')
+    foxpass.add_api_args(parser)
+    snapshot_cache.add_cache_dir_arg(parser)
+    parser.add_argument('--source-group', help='Source group name')
+    parser.add_argument('--dest-group', help='Destination group name')
+    parser.add_argument('--pair', action='append', default=[], metavar='SOURCE:DEST', help='Source and destination group, may be repeated')
+    parser.add_argument('--mapping', help='YAML file mapping source groups to destination groups')
+    parser.add_argument('--remove', action='store_true', help='Remove destination members that are not in any of its sources')
+    parser.add_argument('--workers', type=int, default=bulk.DEFAULT_WORKERS, help='Number of requests sent in parallel')
+    parser.add_argument('--dry-run', action='store_true', help='Print the changes without making them')
+    args = parser.parse_args()
+    if bool(args.source_group) != bool(args.dest_group):
+        parser.error('--source-group and --dest-group must be given together')
+    if not (args.source_group or args.pair or args.mapping):
+        parser.error('give --source-group and --dest-group, --pair or --mapping')
+    return args
+
+
+# return a list of (source, destination) group names from every way they can be given
+def get_pairs(args):
+    pairs = []
+    if args.source_group:
+        pairs.append((args.source_group, args.dest_group))
+    for pair in args.pair:
+        source, sep, dest = pair.partition(':')
+        if not (source and sep and dest):
+            sys.exit('--pair must look like SOURCE:DEST, got {}'.format(pair))
+        pairs.append((source, dest))
+    if args.mapping:
+        pairs.extend(read_mapping(args.mapping))
+    return pairs
+
+
+# return the (source, destination) pairs in a YAML mapping file
+def read_mapping(path):
     try:
-        r = requests.get(args.api_url + ENDPOINT + group_name + '/members/', headers=header)
-        r.raise_for_status()
-    except requests.exceptions.HTTPError as err:
-        sys.exit(err)
-    return r
+        import yaml
+    except ImportError:
+        sys.exit('--mapping requires PyYAML: pip install pyyaml')
+    with open(path) as f:
+        mapping = yaml.safe_load(f) or {}
+    if not isinstance(mapping, dict):
+        sys.exit('{} must map source groups to destination groups'.format(path))
+    pairs = []
+    for source, dests in mapping.items():
+        for dest in dests if isinstance(dests, list) else [dests]:
+            pairs.append((str(source), str(dest)))
+    return pairs
+
+
+# return {destination: set of source groups}
+def destination_sources(pairs):
+    sources = {}
+    for source, dest in pairs:
+        sources.setdefault(dest, set()).add(source)
+    return sources
+
+
+# return a list of (action, group name, user name) that brings every destination in line with its sources
+def plan_changes(sources, members, remove=False):
+    changes = []
+    for dest in sorted(sources):
+        wanted = set().union(*(members[source] for source in sources[dest]))
+        changes.extend(('add', dest, user_name) for user_name in sorted(wanted - members[dest]))
+        if remove:
+            changes.extend(('remove', dest, user_name) for user_name in sorted(members[dest] - wanted))
+    return changes
+
+
+def apply_change(client, action, group_name, user_name):
+    if action == 'add':
+        put_group_member(client, group_name, user_name)
+    else:
+        delete_group_member(client, group_name, user_name)
 
 
-# return list of usernames that are in source_list but not dest_list
-def compare_list(source_list, dest_list):
-    src_users = [user['username'] for user in source_list]
-    dest_users = [user['username'] for user in dest_list]
-    return set(src_users) - set(dest_users)
+# add a foxpass user to a foxpass group
+def put_group_member(client, group_name, user_name):
+    r = client.post(ENDPOINT + group_name + '/members/', json={'username': user_name})
+    r.raise_for_status()
 
 
-# add a foxpass user to a foxpass group
-def put_group_member(header, group_name, user_name):
-    args = get_args()
-    data = json.dumps({'username': user_name})
-    try:
-        r = requests.post(args.api_url + ENDPOINT + group_name + '/members/', headers=header, data=data)
-        r.raise_for_status()
-    except requests.exceptions.HTTPError as err:
-        print('{} failed to add to {}\n{}'.format(user_name, group_name, err))
-    print('{} added to {}'.format(user_name, group_name))
+# remove a foxpass user from a foxpass group
+def delete_group_member(client, group_name, user_name):
+    r = client.delete(ENDPOINT + group_name + '/members/' + user_name + '/')
+    r.raise_for_status()
 
 
 if __name__ == '__main__':
@@ -5,37 +5,101 @@ This script requires the external libraries from requests
 pip install requests
 To run:
 python foxpass_create_users.py --api-key <api_key> --csv-file <file name>
+
+For large imports, keep a per-row report. Users are created 16 at a time unless --workers says otherwise:
+python foxpass_create_users.py --api-key <api_key> --csv-file <file name> --output results.csv
+
+Created usernames are checkpointed to a journal under ~/.foxpass kept for each CSV file, or to --journal.
+If a run dies or some rows fail, run it again with --resume to skip the users that were already
+created without calling the API for them. The journal is deleted once a run finishes without errors.
+A run without --resume refuses to replace an existing journal unless --overwrite-journal is given.
 """
 
 import argparse
 import csv
 import json
 
-import requests
+import bulk
+import foxpass
+import snapshot_cache
 
-URL = 'https://api.foxpass.com/v1/'
 ENDPOINT = 'users/'
+RESULT_HEADER = ['row', 'email', 'username', 'status', 'seconds', 'response']
 
 
 def main():
     parser = argparse.ArgumentParser(description='Create users in Foxpass')
-    parser.add_argument('--api-key', required=True, help='Foxpass API Key')
-    parser.add_argument('--api-url', default=URL, help='Foxpass API Url')
+    foxpass.add_api_args(parser)
+    snapshot_cache.add_cache_dir_arg(parser)
     parser.add_argument('--csv-file', required=True, help='.csv file with emails and usernames')
+    parser.add_argument('--workers', type=int, default=bulk.DEFAULT_WORKERS, help='Number of users to create in parallel')
+    parser.add_argument('--output', help='Write the result of every row to this .csv file')
+    parser.add_argument('--journal', help='Checkpoint created usernames to this file instead of the journal kept for the CSV file under ' + bulk.JOURNAL_DIR)
+    parser.add_argument('--resume', action='store_true', help='Skip the users already recorded in the journal')
+    parser.add_argument('--overwrite-journal', action='store_true', help='Start --journal over when it holds an earlier run')
     args = parser.parse_args()
-    header = {'Authorization': 'Token ' + args.api_key}
-    # parse csv file
-    with open(args.csv_file, 'r') as f:
-        reader = csv.reader(f)
-        for row in reader:
-            try:
-                email = row[0]
-                username = row[1]
-            except IndexError:
-                continue
-            data = {'email': email, 'username': username}
-            r = requests.post(args.api_url + ENDPOINT, headers=header, data=json.dumps(data))
-            print('{}: {}'.format(email, r.json()))
+    client = foxpass.client_from_args(args, pool_size=max(args.workers, foxpass.DEFAULT_POOL_SIZE))
+
+    # parse csv file, rows are read as the workers need them
+    journal_file = args.journal or bulk.journal_path('create_users', args.csv_file)
+    with open(args.csv_file, 'r') as f, bulk.open_journal(journal_file, args.resume, args.overwrite_journal) as journal:
+        rows = read_rows(f)
+        progress = bulk.Progress('rows')
+        results = bulk.run(rows, lambda row: create_user(client, row, args.resume), args.workers, progress, journal, key=row_username)
+        if args.output:
+            with open(args.output, 'a' if args.resume else 'w', newline='') as out:
+                writer = csv.writer(out)
+                if not args.resume:
+                    writer.writerow(RESULT_HEADER)
+                for result in results:
+                    writer.writerow(result_row(result))
+        else:
+            for result in results:
+                row_number, email, username = result.item
+                print('{}: {}'.format(email, result.value if result.ok else result.error))
+        bulk.finish_journal(journal, progress.errors)
+    snapshot_cache.invalidate_lists(client, args.cache_dir)
+
+
+# Yields (row number, email, username), skipping rows without both columns
+def read_rows(f):
+    for row_number, row in enumerate(csv.reader(f), 1):
+        try:
+            email = row[0]
+            username = row[1]
+        except IndexError:
+            continue
+        yield row_number, email, username
+
+
+def row_username(row):
+    return row[2]
+
+
+# Returns the API response body, raising when the user could not be created
+# When resuming, a user the API refuses to create is looked up: the run that died may have created it
+# just before it could be journaled
+def create_user(client, row, resume=False):
+    row_number, email, username = row
+    r = client.post(ENDPOINT, json={'email': email, 'username': username})
+    body = r.json()
+    if not r.ok:
+        if resume and created_before(client, email, username):
+            return {'status': 'ok', 'message': 'already created'}
+        raise RuntimeError(body)
+    return body
+
+
+def created_before(client, email, username):
+    r = client.get(ENDPOINT + username + '/')
+    return r.ok and r.json().get('data', {}).get('email') == email
+
+
+def result_row(result):
+    row_number, email, username = result.item
+    status = 'created' if result.ok else 'error'
+    response = json.dumps(result.value) if result.ok else str(result.error)
+    return [row_number, email, username, status, '{:.3f}'.format(result.seconds), response]
 
 
 if __name__ == '__main__':
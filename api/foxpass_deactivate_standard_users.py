@@ -5,29 +5,35 @@ This script requires the external libraries from requests
 pip install requests
 To run:
 python foxpass_deactive_standard_users.py --api-key <api_key>
+python foxpass_deactive_standard_users.py --api-key <api_key> --dry-run
+python foxpass_deactive_standard_users.py --api-key <api_key> --max-changes 3000 --report offboarding.csv
+The user list is cached and shared with the other scripts. It is always revalidated before deactivating, add --refresh to download it again.
+Users are deactivated in parallel, see deactivate.py.
 """
 import argparse
 
-import requests
-
-URL = 'https://api.foxpass.com/v1/'
-ENDPOINT = 'users/'
-
+import deactivate
+import directory
+import foxpass
+import snapshot_cache
 
 def main():
-    parser = argparse.ArgumentParser(description='List users in Foxpass')
-    parser.add_argument('--api-key', required=True, help='Foxpass API Key')
-    parser.add_argument('--api-url', default=URL, help='Foxpass API Url')
+    parser = argparse.ArgumentParser(description='Deactivate standard users in Foxpass')
+    foxpass.add_api_args(parser)
+    snapshot_cache.add_cache_args(parser, ttl=False)
+    deactivate.add_deactivate_args(parser)
     args = parser.parse_args()
-    header = {'Authorization': 'Token ' + args.api_key}
-    r = requests.get(args.api_url + ENDPOINT, headers=header)
-    r.raise_for_status()
+    client = foxpass.client_from_args(args, pool_size=max(args.workers, foxpass.DEFAULT_POOL_SIZE))
+    cache = snapshot_cache.cache_from_args(args)
 
-    data = r.json()['data']
-    for user in data:
+    standard_users = []
+    for user in directory.iter_users(client, cache):
         if user['is_active'] and not user['is_eng_user'] and not user['is_posix_user'] and not user['is_company_admin'] and not user['is_service_account']:
-            print(user['username'])
-            requests.put(args.api_url + ENDPOINT + user['username'] + '/', headers=header, json={'is_active': False})
+            standard_users.append(user['username'])
+    errors = deactivate.deactivate_users(client, standard_users, args)
+    if not args.dry_run:
+        snapshot_cache.invalidate_lists(client, args.cache_dir)
+    deactivate.exit_on_errors(errors)
 
 
 if __name__ == '__main__':
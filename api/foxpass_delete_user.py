@@ -10,20 +10,21 @@ python foxpass_delete_user.py --api-key <api_key> --username <user name>
 
 import argparse
 
-import requests
+import foxpass
+import snapshot_cache
 
-URL = 'https://api.foxpass.com/v1/'
 ENDPOINT = 'users/'
 
 
 def main():
     parser = argparse.ArgumentParser(description='Delete user in Foxpass')
-    parser.add_argument('--api-key', required=True, help='Foxpass API Key')
-    parser.add_argument('--api-url', default=URL, help='Foxpass API Url')
+    foxpass.add_api_args(parser)
+    snapshot_cache.add_cache_dir_arg(parser)
     parser.add_argument('--username', required=True, help='Foxpass user name')
     args = parser.parse_args()
-    header = {'Authorization': 'Token ' + args.api_key}
-    r = requests.delete(args.api_url + ENDPOINT + args.username + '/', headers=header)
+    client = foxpass.client_from_args(args)
+    r = client.delete(ENDPOINT + args.username + '/')
+    snapshot_cache.invalidate_lists(client, args.cache_dir)
     print(r.json())
 
 
@@ -8,127 +8,224 @@ pip install requests faker
 
 To run:
 python foxpass_dummy_data.py --api-key <api_key> --user-domain example.com --user-count 10 --group-count 2 --custom-fields address date_of_birth image_url ipv4 job mac_address ssn phone_number
+
+For load testing, generate a large directory in parallel, with group sizes following a Zipf distribution:
+python foxpass_dummy_data.py --api-key <api_key> --user-domain example.com --user-count 50000 --group-count 2000 --group-sizes zipf --memberships-per-user 3 --workers 32 --seed 1
+
+Or write the requests to a JSON lines file without calling the API, and send them later:
+python foxpass_dummy_data.py --user-domain example.com --user-count 50000 --group-count 2000 --seed 1 --output directory.jsonl
+python foxpass_dummy_data.py --api-key <api_key> --replay directory.jsonl --workers 32
+
+Every payload is generated up front from the seed, so the same seed and arguments always produce the
+same usernames, gids and memberships. Usernames and gids are unique; uids are assigned by Foxpass.
+Groups and users are created first, then users are updated and added to their groups.
+Requests go through the shared client of foxpass.py, whose rate limit starts at --rate and rises while
+the API keeps up, --max-rate caps it.
+
+Completed requests are checkpointed to ~/.foxpass/dummy_data.journal, or to --journal, together with
+the random seed. If a run dies or some requests fail, run it again with the same arguments plus
+--resume to regenerate the same data and skip the requests that were already done without calling the
+API for them. The journal is deleted once a run finishes without errors. A run without --resume
+refuses to replace the journal of an earlier run unless --overwrite-journal is given.
 """
 
 import argparse
 import json
+import os
 import random
-import requests
-import time
+import re
 
 import faker
 
+import bulk
+import foxpass
+import snapshot_cache
+
 
-API_HOSTNAME = 'https://api.foxpass.com'
 CONSOLE_PAGE_URL = 'https://console.foxpass.com/settings/config/'
+GROUP_SIZES = ('uniform', 'zipf', 'lognormal')
+FIRST_GID = 100000
+DEFAULT_JOURNAL = os.path.join(bulk.JOURNAL_DIR, 'dummy_data.journal')
 
-api_hostname, api_key = '', ''
+client = None
 
 
 def log(text):
     print(text)
 
 
-def send_api_request(method, endpoint, data={}):
-    global api_hostname, api_key
-    headers = {
-        'Authorization': 'Token {}'.format(api_key)
-    }
-    r = requests.request(method=method, url=api_hostname + endpoint, headers=headers, data=json.dumps(data))
-    if r.status_code == 200 and 'reason' not in r.json():
-        return True
-    else:
-        log("Error - {}".format(r.json()))
+# Sends one generated request, raising with the API's answer when it fails
+def send_request(request):
+    r = client.request(request['method'], request['endpoint'], json=request['data'])
+    if r.status_code != 200 or 'reason' in r.json():
+        raise RuntimeError(r.text)
+
+
+def request_key(request):
+    return request['key']
 
 
 def main():
-    global api_hostname, api_key
+    global client
     args = get_args()
-    api_hostname = args.api_hostname
-    api_key = args.api_key
-    
-    fake = faker.Faker('en_US')
+
+    if args.replay:
+        phases = replay_phases(args.replay)
+        seed = None
+    else:
+        # the same seed regenerates the same requests, so a resumed run can recognise finished ones
+        seed = None
+        if args.resume and os.path.exists(args.journal):
+            with bulk.Journal(args.journal, resume=True) as journal:
+                seed = journal_seed(journal)
+        if seed is None:
+            seed = args.seed if args.seed is not None else random.randrange(2 ** 32)
+        phases = generate(seed, args)
+
+    if args.output:
+        write_requests(phases, args.output)
+        log('Wrote {} requests to {} (seed {})'.format(sum(len(phase) for phase in phases), args.output, seed))
+        return
 
     # check if user custom fields have been added
-    if args.custom_fields and len(args.custom_fields) > 0:
+    if args.custom_fields and len(args.custom_fields) > 0 and not args.replay and not args.yes:
         val = input("Please add these custom user fields {} in Foxpass console {} (bottom of the page). \nType OK when ready: ".format(args.custom_fields, CONSOLE_PAGE_URL))
         if not val or val.lower() != 'ok':
             exit('Please add custom fields to Foxpass console and retry.')
-    # create groups, users and custom fields now
-    groups = create_groups(int(args.group_count))
-    users = create_users(fake, args.user_domain, int(args.user_count), groups)
-    update_custom_fields(fake, users, args.custom_fields)
+
+    client = foxpass.client_from_args(args, pool_size=max(args.workers, foxpass.DEFAULT_POOL_SIZE))
+    with bulk.open_journal(args.journal, args.resume, args.overwrite_journal) as journal:
+        if seed is not None and journal_seed(journal) is None:
+            journal.add('seed:{}'.format(seed))
+        # groups and users must exist before users are updated and added to groups
+        errors = 0
+        for phase in phases:
+            progress = bulk.Progress('requests')
+            for result in bulk.run(phase, send_request, args.workers, progress, journal, key=request_key):
+                if not result.ok:
+                    log('Error - {} {}: {}'.format(result.item['method'], result.item['endpoint'], result.error))
+            errors += progress.errors
+        bulk.finish_journal(journal, errors)
+    snapshot_cache.invalidate_lists(client, args.cache_dir)
+    client.close()
     log("All done!")
 
 
-# Create groups
-def create_groups(group_count):
-    groups = []
-    for _ in range(group_count):
-        gid = random.randrange(1000, 2000)
-        group_name = 'dummy_group_{}'.format(gid)
+# Returns the seed recorded by the run being resumed
+def journal_seed(journal):
+    for key in journal.keys:
+        if key.startswith('seed:'):
+            return int(key[len('seed:'):])
+    return None
+
+
+def make_request(key, method, endpoint, data):
+    return {'key': key, 'method': method, 'endpoint': endpoint, 'data': data}
+
+
+# Returns the requests that build the whole directory, as a list of phases that must run in order
+def generate(seed, args):
+    rng = random.Random(seed)
+    fake = faker.Faker('en_US')
+    fake.seed_instance(seed)
+
+    groups = create_groups(rng, args.group_count)
+    users = create_users(fake, args.user_domain, args.user_count)
+    weights = group_weights(rng, len(groups), args.group_sizes)
+
+    creates = [make_request('group:' + group['name'], 'POST', 'groups/', group) for group in groups]
+    creates.extend(make_request('user:' + user['username'], 'POST', 'users/', {'email': user['email'], 'username': user['username']}) for user in users)
+
+    updates = []
+    for user in users:
+        username = user['username']
         data = {
-            'name': group_name,
-            'gid': gid,
-            'is_posix_group': random.choice([True, False])
+            'first_name': user['first_name'],
+            'last_name': user['last_name'],
+            'is_active': True
         }
-        if send_api_request('POST', '/v1/groups/', data):
-            log('Successfully created group {}'.format(group_name))
-            groups.append(group_name)
-        else:
-            log('Error creating group {}'.format(group_name))
+        updates.append(make_request('properties:' + username, 'PUT', 'users/{}/'.format(username), data))
+        # custom fields are their own request, so a rejected field doesn't lose the user's properties
+        if args.custom_fields:
+            custom_fields = {cf: generate_value_cf_type(cf, fake) for cf in args.custom_fields}
+            updates.append(make_request('custom_fields:' + username, 'PUT', 'users/{}/'.format(username), {'custom_fields': custom_fields}))
+        for group_name in pick_groups(rng, groups, weights, args.memberships_per_user):
+            updates.append(make_request('membership:{}:{}'.format(username, group_name), 'POST', 'users/{}/groups/'.format(username), {'name': group_name}))
+    return [creates, updates]
+
+
+# Create groups, each with a distinct gid
+def create_groups(rng, group_count):
+    groups = []
+    for gid in rng.sample(range(FIRST_GID, FIRST_GID + max(10 * group_count, 1000)), group_count):
+        groups.append({
+            'name': 'dummy_group_{}'.format(gid),
+            'gid': gid,
+            'is_posix_group': rng.choice([True, False])
+        })
     return groups
 
 
-# Create users
-def create_users(fake, user_domain, user_count, groups):
+# Create users, a number is added to names that were already taken
+def create_users(fake, user_domain, user_count):
     users = []
+    taken = set()
     for _ in range(user_count):
         first_name = fake.first_name()
         last_name = fake.last_name()
-        username = 'dummy_user_{}'.format(first_name.lower())
-        data = {
-            'email': '{}@{}'.format(username, user_domain), 
-            'username': username
-        }
-        if send_api_request('POST', '/v1/users/', data=data):
-            log('Successfully created user {}'.format(username))
-            users.append(username)
-            
-            # update user properties
-            data = {
-                'first_name': first_name, 
-                'last_name': last_name,
-                'is_active': True
-            }
-            send_api_request('PUT', '/v1/users/{}/'.format(username), data)
-            
-            # add user to a random group
-            if groups and len(groups) >= 1:
-                group_name = random.choice(groups)
-                data = {
-                    'name': group_name
-                }
-                if send_api_request('POST', '/v1/users/{}/groups/'.format(username, group_name), data):
-                    log('Successfully added user {} to group {}'.format(username, group_name))
-                else:
-                    log('Error adding user {} to group {}'.format(username, group_name))
-        else:
-            log('Error creating user {}'.format(username))
+        username = 'dummy_user_{}'.format(re.sub('[^a-z0-9]', '', first_name.lower()))
+        if username in taken:
+            username = '{}_{}'.format(username, re.sub('[^a-z0-9]', '', last_name.lower()))
+        base, n = username, 1
+        while username in taken:
+            n += 1
+            username = '{}{}'.format(base, n)
+        taken.add(username)
+        users.append({
+            'username': username,
+            'email': '{}@{}'.format(username, user_domain),
+            'first_name': first_name,
+            'last_name': last_name
+        })
     return users
 
 
-# Add custom fields to user accounts
-def update_custom_fields(fake, users, custom_fields):
-    for user in users:
-        cf_list = {}
-        for cf in custom_fields:
-            cf_list[cf] = generate_value_cf_type(cf, fake)
-        
-        if send_api_request('PUT', '/v1/users/{}/'.format(user), {'custom_fields': cf_list}):
-            log('Successfully added custom fields {} for the user {}'.format(cf_list, user))
-        else:
-            log('Error adding custom fields {} for the user {}. Pls add custom user fields here first: {}'.format(cf_list, user, CONSOLE_PAGE_URL))
+# Returns the relative size of every group: uniform makes groups about the same size, zipf makes a few
+# very large groups and a long tail of small ones, lognormal is in between
+def group_weights(rng, group_count, distribution):
+    if distribution == 'zipf':
+        return [1.0 / rank for rank in range(1, group_count + 1)]
+    if distribution == 'lognormal':
+        return [rng.lognormvariate(0, 1) for _ in range(group_count)]
+    return [1.0] * group_count
+
+
+# Returns the names of `count` different groups picked according to their weights
+def pick_groups(rng, groups, weights, count):
+    count = min(count, len(groups))
+    picked = set()
+    while len(picked) < count:
+        picked.update(rng.choices(range(len(groups)), weights, k=count - len(picked)))
+    return [groups[i]['name'] for i in sorted(picked)]
+
+
+def write_requests(phases, path):
+    with open(path, 'w') as f:
+        for number, phase in enumerate(phases):
+            for request in phase:
+                f.write(json.dumps(dict(request, phase=number)) + '\n')
+
+
+# Reads the requests written by --output back into phases
+def replay_phases(path):
+    phases = []
+    with open(path) as f:
+        for line in f:
+            request = json.loads(line)
+            while len(phases) <= request['phase']:
+                phases.append([])
+            phases[request['phase']].append(request)
+    return phases
 
 
 # Generate values based on the cf type
@@ -160,14 +257,32 @@ def generate_value_cf_type(cf, fake):
 
 # Return the command line arguments
 def get_args():
-    parser = argparse.ArgumentParser(description='List users in Foxpass')
-    parser.add_argument('--api-hostname', default=API_HOSTNAME, help='Foxpass API Hostname')
-    parser.add_argument('--api-key', required=True, help='Foxpass API Key')
-    parser.add_argument('--user-domain', required=True, help='Email domain of the users')
-    parser.add_argument('--user-count', default=10, help='Number of users to populate')
-    parser.add_argument('--group-count', default=2, help='Number of users to populate')
+    parser = argparse.ArgumentParser(description='Generate dummy users and groups in Foxpass')
+    foxpass.add_api_args(parser, '', key_help='Foxpass API Key, required unless --output is given')
+    snapshot_cache.add_cache_dir_arg(parser)
+    parser.add_argument('--api-hostname', help='Foxpass API Hostname, the older form of --api-url without /v1/')
+    parser.add_argument('--user-domain', help='Email domain of the users')
+    parser.add_argument('--user-count', type=int, default=10, help='Number of users to populate')
+    parser.add_argument('--group-count', type=int, default=2, help='Number of groups to populate')
+    parser.add_argument('--group-sizes', choices=GROUP_SIZES, default='uniform', help='How users are spread over the groups')
+    parser.add_argument('--memberships-per-user', type=int, default=1, help='Number of groups every user is added to')
+    parser.add_argument('--workers', type=int, default=bulk.DEFAULT_WORKERS, help='Number of requests sent in parallel')
+    parser.add_argument('--output', help='Write the requests to this JSON lines file instead of sending them')
+    parser.add_argument('--replay', help='Send the requests from a file written by --output')
+    parser.add_argument('--yes', action='store_true', help='Do not ask whether the custom fields exist')
+    parser.add_argument('--seed', type=int, help='Random seed, the same seed generates the same data')
+    parser.add_argument('--journal', default=DEFAULT_JOURNAL, help='Checkpoint file of completed steps')
+    parser.add_argument('--resume', action='store_true', help='Skip the steps already recorded in the journal')
+    parser.add_argument('--overwrite-journal', action='store_true', help='Start the journal over when it holds an earlier run')
     parser.add_argument('--custom-fields', nargs='*', default=['address', 'date_of_birth', 'image_url', 'ipv4', 'job', 'mac_address', 'ssn','phone_number'], help='Custom fields to populate')
-    return parser.parse_args()
+    args = parser.parse_args()
+    if not args.output and not args.api_key:
+        parser.error('--api-key is required unless --output is given')
+    if args.api_hostname:
+        args.api_url = args.api_hostname + '/v1/'
+    if not args.replay and not args.user_domain:
+        parser.error('--user-domain is required unless --replay is given')
+    return args
 
 
 if __name__ == '__main__':
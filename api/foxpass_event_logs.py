@@ -11,15 +11,32 @@ python3 foxpass_event_logs.py
 
 By default the script will print color-coded logs from the last (7) days. You can use the optional arguments below:
 
---event_type - Filter by event type.
+--event_type - Filter by event type, can be repeated or prefixed with re: for a regular expression.
 --hours - How far back to show the logs in Hours.
 --csv - Output the logs to a CSV file, specify the filename and path.
+--jsonl - Output the log records to a JSON lines file instead.
+--compress, --rotate-size, --rotate - Compress the export with gzip or zstd (also picked by a .gz or .zst name) and split it into shards by size or by hour or day, see log_export.py.
+--summary - Print counts, top event types and an hourly histogram instead of the logs (requires pandas), see log_summary.py.
+--api-key, --api-url, --rate - Foxpass API token (defaults to FOXPASS_API_TOKEN below), URL and request rate limit.
+--concurrency - How many log pages to fetch in parallel (default 8).
+--since-last-run - Only fetch logs newer than the previous run and append them to the local archive (~/.foxpass/logs.db).
+--state-file, --store - Override where --since-last-run keeps its cursor and its logs.
+
+Logs synced with --since-last-run can be searched locally with the query subcommand, which takes the same
+filter, --hours and --csv arguments, e.g.:
+python3 foxpass_event_logs.py query --hours 720
 """
 
 from datetime import datetime, timedelta, timezone
-import requests
 import argparse
-import csv
+
+import foxpass
+import log_archive
+import log_export
+import log_fetcher
+import log_filter
+import log_store
+import log_summary
 
 ##### EDIT THESE #####
 FOXPASS_API_TOKEN = ""
@@ -27,21 +44,13 @@ FOXPASS_API_TOKEN = ""
 # CONSTANTS
 LAST_HOW_MANY_DAYS_LOGS = 7
 
-# "YYYY-MM-DDTHH:MMZ". STARTDATE Default 7 days ago, ENDDATE is current day/time in UTC. Can be changed with the --hours argument.
-STARTDATE = (datetime.now(timezone.utc) - timedelta(days=LAST_HOW_MANY_DAYS_LOGS)).strftime('%Y-%m-%dT%H:%MZ')
-ENDDATE = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%MZ')
-
-FOXPASS_URL = "https://api.foxpass.com/v1/logs/event/"
-HEADERS = {'Authorization': 'Token ' + FOXPASS_API_TOKEN}
-PAGEREQUEST = requests.post(
-    FOXPASS_URL,
-    json={
-        "from": STARTDATE,
-        "to": ENDDATE,
-    },
-    headers=HEADERS
-).json()
-PAGES = PAGEREQUEST["numPages"]
+FOXPASS_API_URL = foxpass.API_URL
+ENDPOINT = 'logs/event/'
+# columns of the --csv export, --jsonl exports the whole records
+CSV_HEADER = ["TIMESTAMP (UTC)", "EVENT_TYPE", "DATA"]
+# fields --summary groups by, and the field telling whether the request succeeded
+SUMMARY_KEYS = ['event_type']
+SUCCESS_FIELD = None
 
 class bcolors:
     HEADER = '\033[95m'
@@ -54,66 +63,74 @@ class bcolors:
     BOLD = '\033[1m'
     UNDERLINE = '\033[4m'
 
-def get_args():
-    parser = argparse.ArgumentParser(description='Pull and parse Event logs from your Foxpass environment')
-    parser.add_argument('--event_type', help='Filter logs by event type')
-    parser.add_argument('--hours', type=int, help='How far back to check the logs in hours')
-    parser.add_argument('--csv', help='Export a CSV of the log data to the specified filename and path')
-    return parser.parse_args()
+# Returns the options shared by the default fetch mode and the query subcommand
+def shared_args():
+    shared = argparse.ArgumentParser(add_help=False)
+    shared.add_argument('--event_type', action='append', help='Filter logs by event type, can be repeated')
+    shared.add_argument('--hours', type=int, help='How far back to check the logs in hours')
+    log_summary.add_summary_args(shared)
+    log_export.add_export_args(shared)
+    shared.add_argument('--store', default=log_archive.DEFAULT_PATH, help='Local log archive, --since-last-run appends to it and query reads from it. A .jsonl path keeps a plain JSON lines file instead')
+    return shared
 
-# Builds an if statement to filter the logs based on user arguments
+def get_args():
+    shared = shared_args()
+    parser = argparse.ArgumentParser(parents=[shared], description='Pull and parse Event logs from your Foxpass environment')
+    foxpass.add_api_args(parser, FOXPASS_API_TOKEN, FOXPASS_API_URL)
+    parser.add_argument('--concurrency', type=int, default=log_fetcher.DEFAULT_CONCURRENCY, help='Number of log pages to fetch in parallel')
+    parser.add_argument('--since-last-run', action='store_true', help='Only fetch logs newer than the previous --since-last-run and append them to the local store')
+    parser.add_argument('--state-file', default=log_store.default_path('event_logs_state.json'), help='Where --since-last-run keeps its cursor')
+    log_archive.add_query_command(parser, shared_args())
+    args = parser.parse_args()
+    if args.command != 'query' and not args.api_key:
+        parser.error('--api-key is required, or set FOXPASS_API_TOKEN')
+    return args
+
+# Builds a compiled filter from the user arguments, each argument is a list of accepted values
 def build_query(event_type=None):
-    query_string = ""
-    if event_type != None:
-        query_string += "log['event_type']=='{}' and ".format(event_type)
-    if query_string != "":
-	# If the string ends with "and", remove it before returning.
-        if query_string[-2] == 'd':
-            query_string = query_string[:-5]
-    return query_string
-
-# Pulls logs from Foxpass and stores them
-def get_logs():
-    p = 0
-    logs_full = []
-    while p < PAGES:
-        p += 1
-        request = requests.post(
-            FOXPASS_URL,
-            json={
-                "from": STARTDATE,
-                "to": ENDDATE,
-                "page": p,
-                "ascending": True,
-            }, headers=HEADERS).json()
-        request_clean = request["data"]
-        logs_full.append(request_clean)
-    return logs_full
+    return log_filter.build_filter([('event_type', event_type)])
+
+# Streams logs from Foxpass, oldest first
+def get_logs(args, start, end):
+    client = foxpass.client_from_args(args, pool_size=args.concurrency)
+    with client:
+        yield from log_fetcher.LogClient(client, ENDPOINT, start, end, args.concurrency).iter_logs()
 
 # Prints or exports all logs for the specified time period
-def lookup_all(logs, csv_arg=None, csv_writer=None):
-    p=0
-    while p < PAGES:
-        for log in logs[p]:
-            if csv_arg == None:
-                print_logs(log)
-            elif csv_arg != None:
-                csv_export(log, csv_writer)
-        p += 1
+def lookup_all(logs, export=None):
+    for log in logs:
+        if export == None:
+            print_logs(log)
+        else:
+            export.write(log)
 
 # Prints or exports logs based on user-provided filter arguments for the specified time period
-def lookup_filter(logs, if_statement, csvarg=None, csv_writer=None):
-    p=0
-    while p < PAGES:
-        for log in logs[p]:
-            if eval(if_statement) and csvarg == None:
-                print_logs(log)
-            elif eval(if_statement) and csvarg != None:
-                csv_export(log, csv_writer)
-        p += 1
-
-def csv_export(log, csv_writer):
-    csv_writer.writerow([log["timestamp"], log["event_type"], log["data"]])
+def lookup_filter(logs, query, export=None):
+    matches = query.compile()
+    for log in logs:
+        if not matches(log):
+            continue
+        if export == None:
+            print_logs(log)
+        else:
+            export.write(log)
+
+# Prints, exports or summarizes the logs, applying the filter when one was given
+def output(logs, query, export=None, summary=None):
+    if summary:
+        log_summary.summarize(log_filter.select(logs, query), SUMMARY_KEYS, SUCCESS_FIELD, summary)
+    elif not query:
+        lookup_all(logs, export)
+    else:
+        lookup_filter(logs, query, export)
+
+# Returns the --csv columns of a log, in the order of CSV_HEADER
+def csv_row(log):
+    return [log["timestamp"], log["event_type"], log["data"]]
+
+# Returns the --summary options when a summary was asked for
+def summary(args):
+    return args if args.summary else None
 
 # Determines start time based on the --hours argument
 def start_time(hours):
@@ -127,28 +144,37 @@ def print_logs(sourcedict):
         bcolors.OKBLUE + str(sourcedict["data"]),
     )
 
+# Answers from the local archive, --hours limits the window, otherwise everything archived is searched
+def query_archive(args, query, export=None):
+    start = start_time(args.hours) if args.hours else None
+    with log_archive.open_query(args.store, 'event') as archive:
+        output(archive.query(query, start), query, export, summary(args))
+
 def main():
-    global STARTDATE
     args = get_args()
 
-    if args.csv != None:
-        csv_open = open(args.csv, 'w', newline='')
-        csv_writer = csv.writer(csv_open)
-        csv_writer.writerow(["TIMESTAMP (UTC)","EVENT_TYPE","DATA"])
-    else:
-        csv_writer = None
+    with log_export.open_export(args, CSV_HEADER, csv_row) as export:
+        # the window is "YYYY-MM-DDTHH:MMZ" in UTC, from LAST_HOW_MANY_DAYS_LOGS days ago until now unless --hours is given
+        start = start_time(args.hours if args.hours else LAST_HOW_MANY_DAYS_LOGS * 24)
+        end = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%MZ')
+
+        query = build_query(args.event_type)
 
-    if args.hours:
-        STARTDATE = start_time(args.hours)
+        if args.command == 'query':
+            query_archive(args, query, export)
+            return
 
-    if_statement = build_query(args.event_type)
+        if args.since_last_run:
+            cursor = log_store.LogCursor(args.state_file)
+            start = cursor.start(start)
 
-    logs = get_logs()
+        logs = get_logs(args, start, end)
 
-    if if_statement == "":
-        lookup_all(logs, args.csv, csv_writer)
-    else: 
-        lookup_filter(logs, if_statement, args.csv, csv_writer)
+        if args.since_last_run:
+            with log_archive.open_store(args.store, 'event') as store:
+                output(log_store.sync(logs, cursor, store), query, export, summary(args))
+        else:
+            output(logs, query, export, summary(args))
 
 
 if __name__ == '__main__':
@@ -13,33 +13,32 @@ NOTE: This script is for altering single IP whitelists that already exist only.
       can be destructive.
 """
 import argparse
-import json
 import socket
 import sys
 
 import requests
 
-URL = 'https://api.foxpass.com/v1/'
+import foxpass
+
 ENDPOINT = 'whitelist_ips/'
 
 
 def main():
     args = get_args()
-    header = {'Authorization': 'Token ' + args.api_key}
-    whitelist_ip = get_whitelist_ip(header, args.whitelist_name)
+    client = foxpass.client_from_args(args)
+    whitelist_ip = get_whitelist_ip(client, args.whitelist_name)
     target_ip = socket.gethostbyname(args.hostname)
     if whitelist_ip != target_ip:
-        clear_whitelist(header, args.whitelist_name)
-        set_whitelist_ip(header, args.whitelist_name, target_ip)
+        clear_whitelist(client, args.whitelist_name)
+        set_whitelist_ip(client, args.whitelist_name, target_ip)
     else:
         print('{} is already set to {}.'.format(args.whitelist_name, target_ip))
 
 
 # Try to retrieve the current whitelist, this will fail if it's not already created instead of creating it for you
-def get_whitelist_ip(header, whitelist):
-    args = get_args()
+def get_whitelist_ip(client, whitelist):
     try:
-        r = requests.get(args.api_url + ENDPOINT + whitelist + '/', headers=header)
+        r = client.get(ENDPOINT + whitelist + '/')
         r.raise_for_status()
     except requests.exceptions.HTTPError as err:
         sys.exit(err)
@@ -47,11 +46,9 @@ def get_whitelist_ip(header, whitelist):
 
 
 # Re-created the whitelist with the new IP address
-def set_whitelist_ip(header, whitelist, target_ip):
-    data = json.dumps({'name': whitelist, 'ip_address': target_ip})
-    args = get_args()
+def set_whitelist_ip(client, whitelist, target_ip):
     try:
-        r = requests.get(args.api_url + ENDPOINT, headers=header, data=data)
+        r = client.post(ENDPOINT, json={'name': whitelist, 'ip_address': target_ip})
         r.raise_for_status()
     except requests.exceptions.HTTPError as err:
         sys.exit('Failed to update {}.\n{}'.format(whitelist, err))
@@ -60,10 +57,9 @@ def set_whitelist_ip(header, whitelist, target_ip):
 
 # Remove whitelist if it has the wrong IP.
 # This is not a resiliant way to handle this, and can be overly destructive, use with caution.
-def clear_whitelist(header, whitelist):
-    args = get_args()
+def clear_whitelist(client, whitelist):
     try:
-        r = requests.delete(args.api_url + ENDPOINT + whitelist + '/', headers=header)
+        r = client.delete(ENDPOINT + whitelist + '/')
         r.raise_for_status()
     except requests.exceptions.HTTPError as err:
         sys.exit('Failed to delete {}, exiting.'.format(whitelist))
@@ -72,8 +68,7 @@ def clear_whitelist(header, whitelist):
 
 def get_args():
     parser = argparse.ArgumentParser(description='Sync Foxpass LDAP whitelist with DDNS ip')
-    parser.add_argument('--api-key', required=True, help='Foxpass API Key')
-    parser.add_argument('--api-url', default=URL, help='Foxpass API Url')
+    foxpass.add_api_args(parser)
     parser.add_argument('--hostname', required=True, help='Hostname to set whitelist to')
     parser.add_argument('--whitelist-name', required=True, help='Name of whitelist in Foxpass')
     return parser.parse_args()
@@ -12,16 +12,41 @@ python3 foxpass_ldap_logs.py
 
 By default the script will print color-coded LDAP logs from the last (7) days. You can use the optional arguments below:
 
---bind_dn - Filter by binder dn name
+--bind_dn - Filter by binder dn name, prefix with re: for a regular expression.
 --type - Filter by ldap binder type.
+--match_any - Show logs matching any of the filters instead of all of them.
 --hours - How far back to show the logs in Hours.
 --csv - Output the logs to a CSV file, specify the filename and path.
+--jsonl - Output the log records to a JSON lines file instead.
+--compress, --rotate-size, --rotate - Compress the export with gzip or zstd (also picked by a .gz or .zst name) and split it into shards by size or by hour or day, see log_export.py.
+--summary - Print counts, success ratios, top values and an hourly histogram instead of the logs (requires pandas), see log_summary.py.
+--detect - Print brute-force and password spray alerts as the logs stream in instead of the logs, tuned with --window, --failures, --spray and --max-keys, see log_detect.py.
+--api-key, --api-url, --rate - Foxpass API token (defaults to FOXPASS_API_TOKEN below), URL and request rate limit.
+--concurrency - How many log pages to fetch in parallel (default 8).
+--follow - Keep printing new logs as they arrive until interrupted, polling every --min-interval to --max-interval seconds depending on activity, see log_follow.py.
+--since-last-run - Only fetch logs newer than the previous run and append them to the local archive (~/.foxpass/logs.db).
+--state-file, --store - Override where --since-last-run keeps its cursor and its logs.
+
+Filter arguments can be repeated to match any of several values.
+
+Logs synced with --since-last-run can be searched locally with the query subcommand, which takes the same
+filter, --hours and --csv arguments, e.g.:
+python3 foxpass_ldap_logs.py query --hours 720
 """
 
 from datetime import datetime, timedelta, timezone
-import requests
 import argparse
-import csv
+import sys
+
+import foxpass
+import log_archive
+import log_detect
+import log_export
+import log_fetcher
+import log_filter
+import log_follow
+import log_store
+import log_summary
 
 ##### EDIT THESE #####
 FOXPASS_API_TOKEN = ""
@@ -29,21 +54,15 @@ FOXPASS_API_TOKEN = ""
 # CONSTANTS
 LAST_HOW_MANY_DAYS_LOGS = 7
 
-# "YYYY-MM-DDTHH:MMZ". STARTDATE Default 7 days ago, ENDDATE is current day/time in UTC. Can be changed with the --hours argument.
-STARTDATE = (datetime.now(timezone.utc) - timedelta(days=LAST_HOW_MANY_DAYS_LOGS)).strftime('%Y-%m-%dT%H:%MZ')
-ENDDATE = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%MZ')
-
-FOXPASS_URL = "https://api.foxpass.com/v1/logs/ldap/"
-HEADERS = {'Authorization': 'Token ' + FOXPASS_API_TOKEN}
-PAGEREQUEST = requests.post(
-    FOXPASS_URL,
-    json={
-        "from": STARTDATE,
-        "to": ENDDATE,
-    },
-    headers=HEADERS
-).json()
-PAGES = PAGEREQUEST["numPages"]
+FOXPASS_API_URL = foxpass.API_URL
+ENDPOINT = 'logs/ldap/'
+# columns of the --csv export, --jsonl exports the whole records
+CSV_HEADER = ["TIMESTAMP (UTC)", "BIND_DN", "TYPE", "SUCCESS", "MESSAGE"]
+# fields --summary groups by, and the field telling whether the request succeeded
+SUMMARY_KEYS = ['bindDn', 'type']
+SUCCESS_FIELD = 'success'
+# field naming the account --detect counts failures for
+DETECT_ACCOUNT = 'bindDn'
 
 class bcolors:
     HEADER = '\033[95m'
@@ -56,69 +75,92 @@ class bcolors:
     BOLD = '\033[1m'
     UNDERLINE = '\033[4m'
 
+# Returns the options shared by the default fetch mode and the query subcommand
+def shared_args():
+    shared = argparse.ArgumentParser(add_help=False)
+    shared.add_argument('--bind_dn', action='append', help='Filter logs by binder dn name, can be repeated')
+    shared.add_argument('--type', action='append', help='Filter logs by ldap binder type, can be repeated')
+    shared.add_argument('--match_any', action='store_true', help='Show logs matching any of the filters instead of all of them')
+    shared.add_argument('--hours', type=int, help='How far back to check the logs in hours')
+    log_summary.add_summary_args(shared)
+    log_detect.add_detect_args(shared)
+    log_export.add_export_args(shared)
+    shared.add_argument('--store', default=log_archive.DEFAULT_PATH, help='Local log archive, --since-last-run appends to it and query reads from it. A .jsonl path keeps a plain JSON lines file instead')
+    return shared
+
 def get_args():
-    parser = argparse.ArgumentParser(description='Pull and parse LDAP logs from your Foxpass environment')
-    parser.add_argument('--bind_dn', help='Filter logs by binder dn name')
-    parser.add_argument('--type', help='Filter logs by ldap binder type')
-    parser.add_argument('--hours', type=int, help='How far back to check the logs in hours')
-    parser.add_argument('--csv', help='Export a CSV of the log data to the specified filename and path')
-    return parser.parse_args()
-
-# Builds an if statement to filter the logs based on user arguments
-def build_query(bind_dn=None, request_type=None):
-    query_string = ""
-    if bind_dn != None:
-        query_string += "log['bindDn']=='{}' and ".format(bind_dn)
-    if request_type != None:
-        query_string += "log['type']=='{}' and ".format(request_type)
-    if query_string != "":
-	# If the string ends with "and", remove it before returning.
-        if query_string[-2] == 'd':
-            query_string = query_string[:-5]
-    return query_string
-
-# Pulls logs from Foxpass and stores them
-def get_logs():
-    p = 0
-    logs_full = []
-    while p < PAGES:
-        p += 1
-        request = requests.post(
-            FOXPASS_URL,
-            json={
-                "from": STARTDATE,
-                "to": ENDDATE,
-                "page": p,
-                "ascending": True,
-            }, headers=HEADERS).json()
-        request_clean = request["data"]
-        logs_full.append(request_clean)
-    return logs_full
+    shared = shared_args()
+    parser = argparse.ArgumentParser(parents=[shared], description='Pull and parse LDAP logs from your Foxpass environment')
+    foxpass.add_api_args(parser, FOXPASS_API_TOKEN, FOXPASS_API_URL)
+    parser.add_argument('--concurrency', type=int, default=log_fetcher.DEFAULT_CONCURRENCY, help='Number of log pages to fetch in parallel')
+    log_follow.add_follow_args(parser)
+    parser.add_argument('--since-last-run', action='store_true', help='Only fetch logs newer than the previous --since-last-run and append them to the local store')
+    parser.add_argument('--state-file', default=log_store.default_path('ldap_logs_state.json'), help='Where --since-last-run keeps its cursor')
+    log_archive.add_query_command(parser, shared_args())
+    args = parser.parse_args()
+    if args.command != 'query' and not args.api_key:
+        parser.error('--api-key is required, or set FOXPASS_API_TOKEN')
+    if args.follow and args.summary:
+        parser.error('--summary needs the logs to end and cannot be used with --follow')
+    return args
+
+# Builds a compiled filter from the user arguments, each argument is a list of accepted values
+def build_query(bind_dn=None, request_type=None, match_any=False):
+    return log_filter.build_filter([('bindDn', bind_dn), ('type', request_type)], match_any)
+
+# Streams logs from Foxpass, oldest first
+def get_logs(args, start, end):
+    client = foxpass.client_from_args(args, pool_size=args.concurrency)
+    with client:
+        yield from log_fetcher.LogClient(client, ENDPOINT, start, end, args.concurrency).iter_logs()
+
+# Streams logs from Foxpass from start on, and then new logs as they arrive until interrupted
+def follow_logs(start, args, on_poll):
+    client = foxpass.client_from_args(args, pool_size=args.concurrency)
+    with client:
+        yield from log_follow.follow(client, ENDPOINT, start, args, on_poll)
 
 # Prints or exports all logs for the specified time period
-def lookup_all(logs, csv_arg=None, csv_writer=None):
-    p=0
-    while p < PAGES:
-        for log in logs[p]:
-            if csv_arg == None:
-                print_logs(log)
-            elif csv_arg != None:
-                csv_export(log, csv_writer)
-        p += 1
+def lookup_all(logs, export=None):
+    for log in logs:
+        if export == None:
+            print_logs(log)
+        else:
+            export.write(log)
 
 # Prints or exports logs based on user-provided filter arguments for the specified time period
-def lookup_filter(logs, if_statement, csvarg=None, csv_writer=None):
-    p=0
-    while p < PAGES:
-        for log in logs[p]:
-            if eval(if_statement) and csvarg == None:
-                print_logs(log)
-            elif eval(if_statement) and csvarg != None:
-                csv_export(log, csv_writer)
-        p += 1
-
-def csv_export(log, csv_writer):
-    csv_writer.writerow([log["timestamp"], log["bindDn"], log["type"], log["success"], log["message"]])
+def lookup_filter(logs, query, export=None):
+    matches = query.compile()
+    for log in logs:
+        if not matches(log):
+            continue
+        if export == None:
+            print_logs(log)
+        else:
+            export.write(log)
+
+# Prints, exports, summarizes or checks the logs for attacks, applying the filter when one was given
+def output(logs, query, export=None, summary=None, detect=None):
+    if detect:
+        log_detect.detect(log_filter.select(logs, query), DETECT_ACCOUNT, detect)
+    elif summary:
+        log_summary.summarize(log_filter.select(logs, query), SUMMARY_KEYS, SUCCESS_FIELD, summary)
+    elif not query:
+        lookup_all(logs, export)
+    else:
+        lookup_filter(logs, query, export)
+
+# Returns the --csv columns of a log, in the order of CSV_HEADER
+def csv_row(log):
+    return [log["timestamp"], log["bindDn"], log["type"], log["success"], log["message"]]
+
+# Returns the --summary options when a summary was asked for
+def summary(args):
+    return args if args.summary else None
+
+# Returns the --detect options when detection was asked for
+def detect(args):
+    return args if args.detect else None
 
 # Determines start time based on the --hours argument
 def start_time(hours):
@@ -134,28 +176,49 @@ def print_logs(sourcedict):
         bcolors.OKBLUE + sourcedict["message"],
     )
 
+# Answers from the local archive, --hours limits the window, otherwise everything archived is searched
+def query_archive(args, query, export=None):
+    start = start_time(args.hours) if args.hours else None
+    with log_archive.open_query(args.store, 'ldap') as archive:
+        output(archive.query(query, start), query, export, summary(args), detect(args))
+
 def main():
-    global STARTDATE
     args = get_args()
 
-    if args.csv != None:
-        csv_open = open(args.csv, 'w', newline='')
-        csv_writer = csv.writer(csv_open)
-        csv_writer.writerow(["TIMESTAMP (UTC)","BIND_DN","TYPE","SUCCESS","MESSAGE"])
-    else:
-        csv_writer = None
-
-    if args.hours:
-        STARTDATE = start_time(args.hours)
-
-    if_statement = build_query(args.bind_dn, args.type)
-
-    logs = get_logs()
-
-    if if_statement == "":
-        lookup_all(logs, args.csv, csv_writer)
-    else: 
-        lookup_filter(logs, if_statement, args.csv, csv_writer)
+    with log_export.open_export(args, CSV_HEADER, csv_row) as export:
+        # the window is "YYYY-MM-DDTHH:MMZ" in UTC, from LAST_HOW_MANY_DAYS_LOGS days ago until now unless --hours is given
+        start = start_time(args.hours if args.hours else LAST_HOW_MANY_DAYS_LOGS * 24)
+        if args.follow and not args.hours:
+            # like tail -f, only the new logs unless --hours asks for the recent ones too
+            start = start_time(0)
+        end = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%MZ')
+
+        query = build_query(args.bind_dn, args.type, args.match_any)
+
+        if args.command == 'query':
+            query_archive(args, query, export)
+            return
+
+        if args.since_last_run:
+            cursor = log_store.LogCursor(args.state_file)
+            start = cursor.start(start)
+
+        # --follow runs these after every poll, so new logs show up and are saved as they arrive
+        on_poll = [sys.stdout.flush]
+        if export:
+            on_poll.append(export.flush)
+
+        if args.follow:
+            logs = follow_logs(start, args, on_poll)
+        else:
+            logs = get_logs(args, start, end)
+
+        if args.since_last_run:
+            with log_archive.open_store(args.store, 'ldap') as store:
+                on_poll.extend([store.flush, cursor.save])
+                output(log_store.sync(logs, cursor, store), query, export, summary(args), detect(args))
+        else:
+            output(logs, query, export, summary(args), detect(args))
 
 
 if __name__ == '__main__':
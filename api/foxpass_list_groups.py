@@ -6,30 +6,37 @@ pip install requests
 
 To run:
 python foxpass_list_groups.py --api-key <api_key>
+
+To export the posix groups as JSON lines:
+python foxpass_list_groups.py --api-key <api_key> --format jsonl --posix true
+
+The list is cached and shared with the other scripts, and revalidated on every run unless --cache-ttl allows reusing it for a while. Add --refresh to download it again.
+Groups are written as they arrive. With ijson installed the response is parsed as it downloads too, so
+memory use does not grow with the directory, see directory.py.
 """
 
 import argparse
 
-import requests
-
-URL = 'https://api.foxpass.com/v1/'
-ENDPOINT = 'groups/'
+import directory
+import foxpass
+import list_output
+import log_filter
+import snapshot_cache
 
 
 def main():
     parser = argparse.ArgumentParser(description='List groups in Foxpass')
-    parser.add_argument('--api-key', required=True, help='Foxpass API Key')
-    parser.add_argument('--api-url', default=URL, help='Foxpass API Url')
+    foxpass.add_api_args(parser)
+    snapshot_cache.add_cache_args(parser)
+    list_output.add_output_args(parser, default_column='name')
+    parser.add_argument('--posix', type=log_filter.parse_bool, help='Only list posix (true) or non posix (false) groups')
     args = parser.parse_args()
-    header = {'Authorization': 'Token ' + args.api_key}
-    r = requests.get(args.api_url + ENDPOINT, headers=header)
-    output(r)
-
-
-def output(r):
-    data = r.json()['data']
-    for group in data:
-        print(group['name'])
+    client = foxpass.client_from_args(args)
+    groups = directory.iter_groups(client, snapshot_cache.cache_from_args(args))
+    matches = list_output.make_filter([
+        (lambda group: group.get('is_posix_group'), args.posix),
+    ])
+    list_output.write_records(groups, args, matches)
 
 
 if __name__ == '__main__':
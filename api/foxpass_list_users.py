@@ -6,29 +6,41 @@ pip install requests
 
 To run:
 python foxpass_list_users.py --api-key <api_key>
+
+To export every field of the active posix users as CSV:
+python foxpass_list_users.py --api-key <api_key> --format csv --active true --posix true > users.csv
+python foxpass_list_users.py --api-key <api_key> --format tsv --columns username,email,uid
+
+The list is cached and shared with the other scripts, and revalidated on every run unless --cache-ttl allows reusing it for a while. Add --refresh to download it again.
+Users are written as they arrive. With ijson installed the response is parsed as it downloads too, so
+memory use does not grow with the directory, see directory.py.
 """
 import argparse
 
-import requests
-
-URL = 'https://api.foxpass.com/v1/'
-ENDPOINT = 'users/'
+import directory
+import foxpass
+import list_output
+import log_filter
+import snapshot_cache
 
 
 def main():
     parser = argparse.ArgumentParser(description='List users in Foxpass')
-    parser.add_argument('--api-key', required=True, help='Foxpass API Key')
-    parser.add_argument('--api-url', default=URL, help='Foxpass API Url')
+    foxpass.add_api_args(parser)
+    snapshot_cache.add_cache_args(parser)
+    list_output.add_output_args(parser, default_column='username')
+    parser.add_argument('--active', type=log_filter.parse_bool, help='Only list active (true) or inactive (false) users')
+    parser.add_argument('--posix', type=log_filter.parse_bool, help='Only list posix (true) or non posix (false) users')
+    parser.add_argument('--admin', type=log_filter.parse_bool, help='Only list admins (true) or non admins (false)')
     args = parser.parse_args()
-    header = {'Authorization': 'Token ' + args.api_key}
-    r = requests.get(args.api_url + ENDPOINT, headers=header)
-    output(r)
-
-
-def output(r):
-    data = r.json()['data']
-    for group in data:
-        print(group['username'])
+    client = foxpass.client_from_args(args)
+    users = directory.iter_users(client, snapshot_cache.cache_from_args(args))
+    matches = list_output.make_filter([
+        (lambda user: directory.user_value(user, 'is_active'), args.active),
+        (lambda user: user.get('is_posix_user'), args.posix),
+        (lambda user: user.get('is_company_admin'), args.admin),
+    ])
+    list_output.write_records(users, args, matches)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+
+"""
+This script builds one timeline of LDAP, RADIUS and Event logs, for investigating what a user did
+across Foxpass without running the three log scripts and sorting their exports by hand.
+
+Required packages:
+pip install requests
+
+To run:
+python3 foxpass_log_timeline.py --api-key <api_key> --hours 48 --user alice
+
+The three log types are fetched at the same time, each on its own background thread that keeps at
+most --concurrency pages ready, and their ascending streams are merged with a heap. Every record is
+read once and memory does not grow with the window. LDAP records are attributed to the user named
+by the first part of their bindDn, e.g. uid=alice,ou=people,dc=example,dc=com is alice.
+
+--user - Only show these users, can be repeated or prefixed with re: for a regular expression.
+--source - Only merge these log types, can be repeated.
+--format, --columns - Print text, jsonl, csv or tsv and choose the fields.
+"""
+
+from datetime import datetime, timedelta, timezone
+import argparse
+import heapq
+from operator import itemgetter
+
+import foxpass
+import list_output
+import log_fetcher
+import log_filter
+
+DEFAULT_HOURS = 24
+SOURCES = {
+    'ldap': 'logs/ldap/',
+    'radius': 'logs/radius/',
+    'event': 'logs/event/',
+}
+COLUMNS = 'timestamp,source,user,success,detail'
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Merge LDAP, RADIUS and Event logs into one timeline per user')
+    foxpass.add_api_args(parser)
+    parser.add_argument('--hours', type=int, default=DEFAULT_HOURS, help='How far back to check the logs in hours')
+    parser.add_argument('--user', action='append', help='Only show these users, can be repeated')
+    parser.add_argument('--source', action='append', choices=list(SOURCES), help='Only merge these log types, can be repeated')
+    parser.add_argument('--concurrency', type=int, default=log_fetcher.DEFAULT_CONCURRENCY, help='Number of log pages to fetch in parallel per log type')
+    list_output.add_output_args(parser, default_column='user')
+    parser.set_defaults(columns=COLUMNS)
+    return parser.parse_args()
+
+
+# Returns the user a bind DN authenticates as, the value of its first attribute
+def bind_dn_user(bind_dn):
+    if not bind_dn or '=' not in bind_dn:
+        return None
+    return bind_dn.split(',', 1)[0].split('=', 1)[1].strip()
+
+
+def ldap_entry(log):
+    return {
+        'timestamp': log['timestamp'],
+        'source': 'ldap',
+        'user': bind_dn_user(log.get('bindDn')),
+        'success': bool(log.get('success')),
+        'detail': '{} {}'.format(log.get('type', ''), log.get('message', '')).strip(),
+    }
+
+
+def radius_entry(log):
+    return {
+        'timestamp': log['timestamp'],
+        'source': 'radius',
+        'user': log.get('username'),
+        'success': bool(log.get('success')),
+        'detail': '{} from {}'.format(log.get('message', ''), log.get('ipAddress', '')),
+    }
+
+
+def event_entry(log):
+    data = log.get('data')
+    user = log.get('username')
+    if user is None and isinstance(data, dict):
+        user = data.get('username', data.get('user'))
+    return {
+        'timestamp': log['timestamp'],
+        'source': 'event',
+        'user': user,
+        'success': None,
+        'detail': '{} {}'.format(log.get('event_type', ''), data if data is not None else '').strip(),
+    }
+
+
+ENTRIES = {
+    'ldap': ldap_entry,
+    'radius': radius_entry,
+    'event': event_entry,
+}
+
+
+# Streams the timeline entries of one log type, oldest first
+def source_entries(client, source, start, end, concurrency):
+    pages = log_fetcher.LogClient(client, SOURCES[source], start, end, concurrency).iter_pages()
+    make_entry = ENTRIES[source]
+    for page in log_fetcher.prefetch(pages, concurrency):
+        for log in page:
+            yield make_entry(log)
+
+
+# Merges ascending streams of entries into one ascending stream, in O(log k) per entry for k streams
+def merge(streams):
+    return heapq.merge(*streams, key=itemgetter('timestamp'))
+
+
+def window(hours):
+    now = datetime.now(timezone.utc)
+    return (now - timedelta(hours=hours)).strftime('%Y-%m-%dT%H:%MZ'), now.strftime('%Y-%m-%dT%H:%MZ')
+
+
+def main():
+    args = get_args()
+    sources = args.source or list(SOURCES)
+    start, end = window(args.hours)
+    query = log_filter.build_filter([('user', args.user)])
+    client = foxpass.client_from_args(args, pool_size=args.concurrency * len(sources))
+    with client:
+        timeline = merge([source_entries(client, source, start, end, args.concurrency) for source in sources])
+        list_output.write_records(log_filter.select(timeline, query), args)
+
+
+if __name__ == '__main__':
+    main()
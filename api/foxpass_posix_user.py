@@ -8,23 +8,23 @@ To run:
 python foxpass_make_posix_user.py --api-key <api_key> --user <username>
 """
 import argparse
-import json
 
-import requests
+import foxpass
+import snapshot_cache
 
-URL = 'https://api.foxpass.com/v1/'
 ENDPOINT = 'users/'
 DATA = {'is_posix_user': True}
 
 
 def main():
     parser = argparse.ArgumentParser(description='Sets user as Posix in Foxpass')
-    parser.add_argument('--api-key', required=True, help='Foxpass API Key')
-    parser.add_argument('--api-url', default=URL, help='Foxpass API Url')
+    foxpass.add_api_args(parser)
+    snapshot_cache.add_cache_dir_arg(parser)
     parser.add_argument('--user', required=True, help='Foxpass username')
     args = parser.parse_args()
-    header = {'Authorization': 'Token ' + args.api_key}
-    r = requests.put(args.api_url + ENDPOINT + args.user + '/', headers=header, data=json.dumps(DATA))
+    client = foxpass.client_from_args(args)
+    r = client.put(ENDPOINT + args.user + '/', json=DATA)
+    snapshot_cache.invalidate_lists(client, args.cache_dir)
     print(r.json())
 
 
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+
+"""
+Brings Foxpass in line with a desired-state file of users, groups and group memberships.
+
+This script requires the external libraries from requests, and pyyaml for .yaml state files
+pip install requests pyyaml
+
+To run:
+python foxpass_reconcile.py --api-key <api_key> --state directory.yaml --dry-run
+python foxpass_reconcile.py --api-key <api_key> --state directory.yaml
+
+The state file is YAML or JSON:
+users:
+  alice:
+    email: alice@example.com
+    is_posix_user: true
+  bob:
+    is_active: false
+groups:
+  eng:
+    gid: 510
+    is_posix_group: true
+    members: [alice]
+
+Users and groups missing from Foxpass are created, users need an email for that. Every other user
+field is set with a PUT when it differs. A group's members list is exact: listed users are added and
+everyone else is removed. Users, groups and members left out of the file are not touched, unless
+--deactivate-unlisted is given, which deactivates every active user missing from the file.
+The API cannot change an existing group's gid or posix flag, so those differences are only reported.
+
+The plan is checked before anything is changed: a user to create without an email stops the script,
+and like the other deactivating scripts --max-changes refuses to run when more users than that would
+be deactivated. The script exits with an error when any change failed.
+
+The whole directory is read once up front with concurrent requests, and the plan is applied in
+two parallel passes: creations first, then updates and membership changes.
+"""
+import argparse
+import json
+import sys
+
+import requests
+
+import bulk
+import deactivate
+import directory
+import foxpass
+import snapshot_cache
+
+USERS_ENDPOINT = 'users/'
+GROUPS_ENDPOINT = 'groups/'
+# user fields only sent when the user is created
+CREATE_USER_FIELDS = ('username', 'email')
+GROUP_FIELDS = ('gid', 'is_posix_group')
+
+
+def main():
+    args = get_args()
+    desired = read_state(args.state)
+    client = foxpass.client_from_args(args, pool_size=max(args.workers, foxpass.DEFAULT_POOL_SIZE))
+    try:
+        actual = directory.snapshot(client, args.workers)
+    except requests.exceptions.HTTPError as err:
+        sys.exit(err)
+
+    phases = plan(desired, actual, args.deactivate_unlisted)
+    changes = [change for phase in phases for change in phase]
+    if not changes:
+        print('Nothing to change')
+        return
+    check_plan(changes, args.max_changes)
+    for change in changes:
+        print('{}{}'.format('Would ' if args.dry_run else '', describe(change)))
+    if args.dry_run:
+        return
+
+    errors = 0
+    for phase in phases:
+        progress = bulk.Progress('changes')
+        for result in bulk.run(phase, lambda change: apply_change(client, change), args.workers, progress):
+            if not result.ok:
+                errors += 1
+                print('Failed to {}: {}'.format(describe(result.item), result.error))
+    snapshot_cache.invalidate_lists(client, args.cache_dir)
+    print('{} changes, {} failed'.format(len(changes), errors))
+    if errors:
+        sys.exit(1)
+
+
+# return the command line arguments
+def get_args():
+    parser = argparse.ArgumentParser(description='Reconcile Foxpass users, groups and memberships with a desired-state file')
+    foxpass.add_api_args(parser)
+    snapshot_cache.add_cache_dir_arg(parser)
+    parser.add_argument('--state', required=True, help='Desired-state .yaml or .json file')
+    parser.add_argument('--deactivate-unlisted', action='store_true', help='Deactivate active users missing from the state file')
+    deactivate.add_max_changes_arg(parser)
+    parser.add_argument('--workers', type=int, default=bulk.DEFAULT_WORKERS, help='Number of requests sent in parallel')
+    parser.add_argument('--dry-run', action='store_true', help='Print the plan without making any change')
+    return parser.parse_args()
+
+
+# return the desired state as {'users': {username: fields}, 'groups': {name: fields}}
+def read_state(path):
+    with open(path) as f:
+        if path.endswith('.json'):
+            state = json.load(f)
+        else:
+            try:
+                import yaml
+            except ImportError:
+                sys.exit('.yaml state files require PyYAML: pip install pyyaml')
+            state = yaml.safe_load(f)
+    state = state or {}
+    return {
+        'users': {str(name): fields or {} for name, fields in (state.get('users') or {}).items()},
+        'groups': {str(name): fields or {} for name, fields in (state.get('groups') or {}).items()},
+    }
+
+
+# return two lists of changes: creations, then everything that depends on them.
+# A change is (action, name, data).
+def plan(desired, actual, deactivate_unlisted=False):
+    creates = []
+    updates = []
+
+    for username, fields in sorted(desired['users'].items()):
+        user = actual.users.get(username)
+        settable = {field: value for field, value in fields.items() if field not in CREATE_USER_FIELDS}
+        if user is None:
+            creates.append(('create user', username, {'username': username, 'email': fields.get('email')}))
+            changed = settable
+        else:
+            changed = {field: value for field, value in settable.items() if directory.user_value(user, field) != value}
+        if changed:
+            updates.append(('update user', username, changed))
+
+    if deactivate_unlisted:
+        for username, user in sorted(actual.users.items()):
+            if username not in desired['users'] and directory.user_value(user, 'is_active'):
+                updates.append(('update user', username, {'is_active': False}))
+
+    for name, fields in sorted(desired['groups'].items()):
+        group = actual.groups.get(name)
+        current = actual.members.get(name, set())
+        if group is None:
+            data = {'name': name}
+            data.update((field, fields[field]) for field in GROUP_FIELDS if field in fields)
+            creates.append(('create group', name, data))
+        else:
+            for field in GROUP_FIELDS:
+                if field in fields and group.get(field) != fields[field]:
+                    print('Group {} has {} {} instead of {}, the API cannot change it'.format(name, field, group.get(field), fields[field]))
+        if 'members' in fields:
+            wanted = set(fields['members'] or [])
+            updates.extend(('add member', name, username) for username in sorted(wanted - current))
+            updates.extend(('remove member', name, username) for username in sorted(current - wanted))
+
+    return [creates, updates]
+
+
+# Exits before any change is made when a user to create has no email, or when more users would be
+# deactivated than --max-changes allows
+def check_plan(changes, max_changes=None):
+    missing = [name for action, name, data in changes if action == 'create user' and not data.get('email')]
+    if missing:
+        sys.exit('Users need an email to be created: {}'.format(', '.join(missing)))
+    deactivations = [name for action, name, data in changes if action == 'update user' and data.get('is_active') is False]
+    deactivate.check_max_changes(len(deactivations), max_changes)
+
+
+def describe(change):
+    action, name, data = change
+    if action == 'add member':
+        return 'add {} to {}'.format(data, name)
+    if action == 'remove member':
+        return 'remove {} from {}'.format(data, name)
+    return '{} {} {}'.format(action, name, json.dumps(data, sort_keys=True))
+
+
+def apply_change(client, change):
+    action, name, data = change
+    if action == 'create user':
+        r = client.post(USERS_ENDPOINT, json=data)
+    elif action == 'update user':
+        r = client.put(USERS_ENDPOINT + name + '/', json=data)
+    elif action == 'create group':
+        r = client.post(GROUPS_ENDPOINT, json=data)
+    elif action == 'add member':
+        r = client.post(GROUPS_ENDPOINT + name + '/members/', json={'username': data})
+    else:
+        r = client.delete(GROUPS_ENDPOINT + name + '/members/' + data + '/')
+    r.raise_for_status()
+
+
+if __name__ == '__main__':
+    main()
@@ -8,38 +8,45 @@ pip install requests
 
 To run:
 python foxpass_remove_abandoned_users.py --api-key <api_key>
+
+Memberships are indexed by listing every group's members concurrently, which takes one request per group
+instead of one per active user.
 """
 from __future__ import print_function
 
 import argparse
-import json
-
-import requests
 
-URL = 'https://api.foxpass.com/v1/'
-ENDPOINT = 'users/'
-DATA = {'is_active': False}
+import deactivate
+import directory
+import foxpass
+import snapshot_cache
 
 
 def main():
     parser = argparse.ArgumentParser(description='Deactivate Foxpass users who aren\'t a member of any group')
-    parser.add_argument('--api-key', required=True, help='Foxpass API Key')
-    parser.add_argument('--api-url', default=URL, help='Foxpass API Url')
+    foxpass.add_api_args(parser)
+    snapshot_cache.add_cache_dir_arg(parser)
+    deactivate.add_deactivate_args(parser)
     args = parser.parse_args()
-    users = user_list(args.api_key, args.api_url)
-    for user in users:
-        process_user(args.api_key, user, args.api_url)
-
-
-def user_list(api_key, api_url):
-    header = {'Authorization': 'Token ' + api_key}
-    r = requests.get(api_url + ENDPOINT, headers=header)
-
-    # check to make sure request completed successfully
-    r.raise_for_status()
-
+    client = foxpass.client_from_args(args, pool_size=max(args.workers, foxpass.DEFAULT_POOL_SIZE))
+    users = user_list(client)
+    user_calls = client.requests
+    groups = directory.groups(client)
+    members = directory.members_by_group(client, [group['name'] for group in groups], args.workers)
+    calls = client.requests
+    errors = deactivate.deactivate_users(client, abandoned_users(users, members), args)
+    if not args.dry_run:
+        snapshot_cache.invalidate_lists(client, args.cache_dir)
+
+    # the old scan listed the users and then made one request per active user
+    print('Indexed {} groups in {} API calls, {} fewer than checking each of {} active users'.format(
+        len(groups), calls, user_calls + len(users) - calls, len(users)))
+    deactivate.exit_on_errors(errors)
+
+
+def user_list(client):
     users = []
-    for user in r.json()['data']:
+    for user in directory.iter_users(client):
         # only deactivate active users
         if user['active']:
             users.append(user['username'])
@@ -47,26 +54,10 @@ def user_list(api_key, api_url):
     return users
 
 
-def process_user(api_key, user, api_url):
-    header = {'Authorization': 'Token ' + api_key}
-    r = requests.get(api_url + ENDPOINT + user + '/groups/', headers=header)
-
-    # check to make sure request completed successfully
-    if not r.status_code == requests.codes.ok:
-        r.raise_for_status()
-
-    memberships = r.json()['data']
-    if not memberships:
-        deactivate_user(api_key, user, api_url)
-
-
-def deactivate_user(api_key, user, api_url):
-    header = {'Authorization': 'Token ' + api_key}
-    r = requests.put(api_url + ENDPOINT + user + '/', headers=header, data=json.dumps(DATA))
-    if r.status_code == requests.codes.ok:
-        print('Deactivated {}'.format(user))
-    else:
-        print('Error deactivating user {}. Status code {}'.format(user, r.status_code))
+# Returns the users, in their original order, who aren't in any group
+def abandoned_users(users, members):
+    grouped = directory.grouped_usernames(members)
+    return [user for user in users if user not in grouped]
 
 
 if __name__ == '__main__':
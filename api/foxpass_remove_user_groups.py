@@ -8,70 +8,102 @@ pip install requests
 
 To run:
 python foxpass_remove_user_groups.py --api-key <api_key>
+
+To see which groups would be removed without removing them:
+python foxpass_remove_user_groups.py --api-key <api_key> --dry-run
+
+The user and group lists are each fetched once and matched locally, then the groups are deleted in parallel.
 """
 from __future__ import print_function
 
 import argparse
+import time
 
-import requests
+import bulk
+import directory
+import foxpass
+import snapshot_cache
 
-URL = 'https://api.foxpass.com/v1/'
-USERS_ENDPOINT = 'users/'
 GROUPS_ENDPOINT = 'groups/'
+USERS_ENDPOINT = 'users/'
+# probes of the old per-group lookup timed to estimate what it would have cost
+PROBE_SAMPLE = 10
 
 
 def main():
     parser = argparse.ArgumentParser(description='Removes groups that match a username and gid of a user')
-    parser.add_argument('--api-key', required=True, help='Foxpass API Key')
-    parser.add_argument('--api-url', default=URL, help='Foxpass API Url')
+    foxpass.add_api_args(parser)
+    snapshot_cache.add_cache_dir_arg(parser)
+    parser.add_argument('--workers', type=int, default=bulk.DEFAULT_WORKERS, help='Number of groups deleted in parallel')
+    parser.add_argument('--dry-run', action='store_true', help='Print the groups that would be removed and stop')
     args = parser.parse_args()
 
-    # get list of groups
-    groups = group_list(args.api_key, args.api_url)
-
-    # go through each group and check to see if user exists
-    for group in groups:
-        # compare gid; if equal, delete
-        if check_group_for_user(args.api_key, group, args.api_url):
-            remove_group(args.api_key, group, args.api_url)
-
-
-def group_list(api_key, api_url):
-    header = {'Authorization': 'Token ' + api_key}
-    r = requests.get(api_url + GROUPS_ENDPOINT, headers=header)
-
-    # check to make sure request completed successfully
-    r.raise_for_status()
-
-    return r.json()['data']
-
+    client = foxpass.client_from_args(args, pool_size=max(args.workers, foxpass.DEFAULT_POOL_SIZE))
+    began = time.monotonic()
+
+    # get lists of users and groups
+    uids = user_uids(client)
+    groups_began = time.monotonic()
+    groups = directory.groups(client)
+    groups_seconds = time.monotonic() - groups_began
+    elapsed = time.monotonic() - began
+    # the old probe listed groups, then requested users/<group>/ for each group one at a time
+    estimate = groups_seconds + probe_seconds(client, groups) * len(groups)
+
+    # compare gid of every group named after a user to that user's uid
+    matches = matching_groups(groups, uids)
+    if args.dry_run:
+        for group in matches:
+            print('Would delete group {} (gid {})'.format(group['name'], group['gid']))
+    else:
+        for result in bulk.run(matches, lambda group: remove_group(client, group), args.workers):
+            if result.ok:
+                print('Deleted group {}'.format(result.item['name']))
+            else:
+                print('Error deleting group {}. {}'.format(result.item['name'], result.error))
+        snapshot_cache.invalidate_lists(client, args.cache_dir)
 
-def check_group_for_user(api_key, group, api_url):
-    header = {'Authorization': 'Token ' + api_key}
-    r = requests.get(api_url + USERS_ENDPOINT + group['name'] + '/', headers=header)
+    print('Matched {} of {} groups in {:.1f}s, about {:.1f}s with a request per group'.format(
+        len(matches), len(groups), elapsed, estimate))
 
-    if r.status_code != requests.codes.ok:
-        # no user with that group name
-        return False
 
-    user = r.json()['data']
+# Returns the median time of a users/<group>/ probe, timed on a sample spread over the groups
+def probe_seconds(client, groups):
+    sample = groups[::max(1, len(groups) // PROBE_SAMPLE)][:PROBE_SAMPLE]
+    times = []
+    for group in sample:
+        began = time.monotonic()
+        client.get(USERS_ENDPOINT + group['name'] + '/')
+        times.append(time.monotonic() - began)
+    times.sort()
+    return times[len(times) // 2] if times else 0.0
 
-    # compare uid to gid
-    if user['uid'] != group['gid']:
-        print("Group {} gid & user uid does not match {}-{}".format(group['name'], group['gid'], user['uid']))
-        return False
 
-    # username matches group name and gid matches
-    return True
+# Returns {username: uid} for every user
+def user_uids(client):
+    return {user['username']: user['uid'] for user in directory.users(client)}
 
 
-def remove_group(api_key, group, api_url):
-    header = {'Authorization': 'Token ' + api_key}
-    r = requests.delete(api_url + GROUPS_ENDPOINT + group['name'] + '/', headers=header)
-    if r.status_code == requests.codes.ok:
-        print('Deleted group {}'.format(group['name']))
-    else:
-        print('Error deleting group {}. Status code: {}'.format(group['name'], r.status_code))
+# Returns the groups whose name is a username and whose gid is that user's uid
+def matching_groups(groups, uids):
+    matches = []
+    for group in groups:
+        if group['name'] not in uids:
+            # no user with that group name
+            continue
+        uid = uids[group['name']]
+        if uid != group['gid']:
+            print("Group {} gid & user uid does not match {}-{}".format(group['name'], group['gid'], uid))
+            continue
+        # username matches group name and gid matches
+        matches.append(group)
+    return matches
+
+
+def remove_group(client, group):
+    r = client.delete(GROUPS_ENDPOINT + group['name'] + '/')
+    if not r.ok:
+        raise RuntimeError('Status code: {}'.format(r.status_code))
 
 
 if __name__ == '__main__':
@@ -5,55 +5,44 @@ This script requires the external libraries from requests
 pip install requests
 
 To run:
-python foxpass_user_cleanup.py --api-key <api_key>
+python foxpass_user_cleanup.py --api-key <api_key> --keep <username> <username>
+
+To check the list first, and to stop if more users than expected would be deactivated:
+python foxpass_user_cleanup.py --api-key <api_key> --keep <username> --dry-run
+python foxpass_user_cleanup.py --api-key <api_key> --keep <username> --max-changes 3000 --report cleanup.csv
+
+The user list is cached and shared with the other scripts. It is always revalidated before deactivating, add --refresh to download it again.
+Users are deactivated in parallel, see deactivate.py.
 """
 from __future__ import print_function
 
 import argparse
-import json
-
-import requests
-
-URL = 'https://api.foxpass.com/v1/'
-ENDPOINT = 'users/'
-DATA = {'is_active': False}
 
+import deactivate
+import directory
+import foxpass
+import snapshot_cache
 
 def main():
     parser = argparse.ArgumentParser(description='Deactivate Foxpass users')
-    parser.add_argument('--api-key', required=True, help='Foxpass API Key')
-    parser.add_argument('--api-url', default=URL, help='Foxpass API Url')
-    parser.add_argument('--keep', nargs='*', help='List of users to keep')
+    foxpass.add_api_args(parser)
+    parser.add_argument('--keep', nargs='+', required=True, help='List of users to keep, every other active user is deactivated')
+    snapshot_cache.add_cache_args(parser, ttl=False)
+    deactivate.add_deactivate_args(parser)
     args = parser.parse_args()
-    users = user_list(args.api_key, args.api_url)
-    keep_list = []
-    keep_list.extend(args.keep)
-    for user in users:
-        if user not in keep_list:
-            deactivate_user(args.api_key, user, args.api_url)
-
-
-def user_list(api_key, api_url):
-    header = {'Authorization': 'Token ' + api_key}
-    r = requests.get(api_url + ENDPOINT, headers=header)
-    user_list = make_list(r.json()['data'])
-    return user_list
-
-
-def make_list(data):
-    users = []
-    for user in data:
-        users.append(user['username'])
-    return users
-
-
-def deactivate_user(api_key, user, api_url):
-    header = {'Authorization': 'Token ' + api_key}
-    r = requests.put(api_url + ENDPOINT + user + '/', headers=header, data=json.dumps(DATA))
-    if r.status_code == requests.codes.ok:
-        print('Deleted group {}'.format(user))
-    else:
-        print('Error deleting group {}. Status code: {}'.format(user, r.status_code))
+    client = foxpass.client_from_args(args, pool_size=max(args.workers, foxpass.DEFAULT_POOL_SIZE))
+    cache = snapshot_cache.cache_from_args(args)
+    users = user_list(client, cache)
+    keep = set(args.keep)
+    errors = deactivate.deactivate_users(client, [user for user in users if user not in keep], args)
+    if not args.dry_run:
+        snapshot_cache.invalidate_lists(client, args.cache_dir)
+    deactivate.exit_on_errors(errors)
+
+
+# return the usernames of the active users
+def user_list(client, cache=None):
+    return [user['username'] for user in directory.iter_users(client, cache) if directory.user_value(user, 'is_active') is not False]
 
 
 if __name__ == '__main__':
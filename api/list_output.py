@@ -0,0 +1,58 @@
+"""
+Streaming output of directory records for foxpass_list_users.py and foxpass_list_groups.py.
+
+Records are filtered and written one at a time as they arrive, so listing a directory of any size
+runs in constant memory. text prints the chosen columns separated by tabs, jsonl prints one JSON
+object per record, csv and tsv print a header row first.
+
+Usage:
+list_output.add_output_args(parser, default_column='username')
+list_output.write_records(records, args)
+"""
+
+import csv
+import json
+import sys
+
+FORMATS = ('text', 'jsonl', 'csv', 'tsv')
+
+
+def add_output_args(parser, default_column):
+    parser.add_argument('--format', choices=FORMATS, default='text', help='Output format')
+    parser.add_argument('--columns', help='Comma separated fields to print, text prints only {} by default and the other formats every field'.format(default_column))
+    parser.set_defaults(default_column=default_column)
+
+
+# Returns the predicate of the filters, each one is a (field getter, wanted value) pair and a wanted
+# value of None means any value
+def make_filter(filters):
+    filters = [(get, wanted) for get, wanted in filters if wanted is not None]
+
+    def matches(record):
+        return all(bool(get(record)) == wanted for get, wanted in filters)
+    return matches
+
+
+def write_records(records, args, matches=None, stream=sys.stdout):
+    columns = args.columns.split(',') if args.columns else None
+    if args.format == 'text':
+        columns = columns or [args.default_column]
+    records = (record for record in records if matches is None or matches(record))
+
+    if args.format == 'jsonl':
+        for record in records:
+            if columns:
+                record = {column: record.get(column) for column in columns}
+            stream.write(json.dumps(record) + '\n')
+    elif args.format == 'text':
+        for record in records:
+            print('\t'.join(str(record.get(column, '')) for column in columns), file=stream)
+    else:
+        writer = None
+        for record in records:
+            if writer is None:
+                # without --columns the header comes from the first record
+                writer = csv.DictWriter(stream, columns or list(record), extrasaction='ignore',
+                                        delimiter='\t' if args.format == 'tsv' else ',')
+                writer.writeheader()
+            writer.writerow(record)
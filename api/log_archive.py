@@ -0,0 +1,129 @@
+"""
+Local SQLite archive of Foxpass logs, shared by the LDAP, Event and RADIUS log scripts.
+
+Records synced with --since-last-run are kept in one database, indexed on the fields the scripts
+filter on, so questions about past activity are answered locally by the query subcommand instead of
+re-paging the Foxpass API.
+"""
+
+import argparse
+import json
+import sqlite3
+
+import log_store
+
+DEFAULT_PATH = log_store.default_path('logs.db')
+BATCH_SIZE = 1000
+
+# Record fields stored in their own indexed column
+FIELD_COLUMNS = {
+    'bindDn': 'bind_dn',
+    'username': 'username',
+    'ipAddress': 'ip_address',
+    'event_type': 'event_type',
+    'type': 'type',
+    'success': 'success',
+}
+INDEXED_COLUMNS = ('bind_dn', 'username', 'ip_address', 'event_type')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS logs (
+    kind TEXT NOT NULL,
+    record_key TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    bind_dn TEXT,
+    username TEXT,
+    ip_address TEXT,
+    event_type TEXT,
+    type TEXT,
+    success INTEGER,
+    record TEXT NOT NULL,
+    PRIMARY KEY (kind, record_key)
+);
+CREATE INDEX IF NOT EXISTS logs_timestamp ON logs (kind, timestamp);
+""" + "".join(
+    "CREATE INDEX IF NOT EXISTS logs_{0} ON logs (kind, {0}, timestamp);\n".format(column) for column in INDEXED_COLUMNS)
+
+
+class LogArchive:
+    def __init__(self, path, kind):
+        self.kind = kind
+        self.pending = []
+        log_store.make_parent_dir(path)
+        self.db = sqlite3.connect(path)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.executescript(SCHEMA)
+
+    # Records already in the archive are ignored, so overlapping syncs never duplicate rows
+    def append(self, log):
+        self.pending.append(
+            (self.kind, log_store.record_key(log), log['timestamp'])
+            + tuple(log.get(field) for field in FIELD_COLUMNS)
+            + (json.dumps(log),))
+        if len(self.pending) >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.db.executemany(
+                'INSERT OR IGNORE INTO logs (kind, record_key, timestamp, {}, record) VALUES ({})'.format(
+                    ', '.join(FIELD_COLUMNS.values()), ', '.join('?' * (len(FIELD_COLUMNS) + 4))),
+                self.pending)
+            self.pending = []
+        self.db.commit()
+
+    def close(self):
+        self.flush()
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # Yields archived records in ascending timestamp order. Exact and list matches of the filter are
+    # answered from the indexes, regular expressions and --match_any are left to the caller's predicate.
+    def query(self, query=None, start=None, end=None):
+        conditions = ['kind = ?']
+        params = [self.kind]
+        if start:
+            # windows are whole minutes, so compare on the minute prefix of the timestamp
+            conditions.append('timestamp >= ?')
+            params.append(start[:16])
+        if end:
+            conditions.append('timestamp < ?')
+            params.append(end[:16] + '\x7f')
+        if query and not query.match_any:
+            for clause in query.clauses:
+                if clause.field in FIELD_COLUMNS and not clause.patterns:
+                    conditions.append('{} IN ({})'.format(FIELD_COLUMNS[clause.field], ', '.join('?' * len(clause.values))))
+                    params.extend(clause.values)
+        rows = self.db.execute(
+            'SELECT record FROM logs WHERE {} ORDER BY timestamp'.format(' AND '.join(conditions)), params)
+        for record, in rows:
+            yield json.loads(record)
+
+
+# Opens the store --since-last-run appends to, a .jsonl path keeps the plain JSON lines file
+def open_store(path, kind):
+    if path.endswith('.jsonl'):
+        return log_store.LogStore(path)
+    return LogArchive(path, kind)
+
+
+# Opens the store the query subcommand reads, a .jsonl path is the plain JSON lines file
+def open_query(path, kind):
+    if path.endswith('.jsonl'):
+        return log_store.LogStoreReader(path)
+    return LogArchive(path, kind)
+
+
+# Adds the query subcommand, taking the options of `shared` again. They have no defaults there, so an
+# option given before the subcommand is kept unless it is given again after it.
+def add_query_command(parser, shared):
+    for action in shared._actions:
+        action.default = argparse.SUPPRESS
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.add_parser('query', parents=[shared], help='Query the local log archive instead of the Foxpass API')
@@ -0,0 +1,171 @@
+"""
+--detect mode of the RADIUS and LDAP log scripts: flag brute-force and password spray attempts as the
+records stream past, instead of reading through --outcome False output by eye.
+
+Failures are counted over a sliding window of --window minutes, kept as BUCKETS_PER_WINDOW bucketed
+counters per key, so each record costs a few dictionary updates and no history is re-scanned.
+
+brute-force - one account (username, or bindDn for LDAP) failed --failures times within the window.
+flood - one IP address failed --failures times within the window, whatever the accounts.
+spray - one IP address failed against --spray different accounts within the window.
+
+A rule alerts when its count reaches the threshold, and again only once the count has dropped below
+it and come back. At most --max-keys accounts and addresses are tracked per rule, the least recently
+seen are forgotten first, so memory stays bounded however many logs are read. Records without an
+address (LDAP logs may not have one) are only checked for brute force.
+
+No external packages are required.
+
+Usage:
+log_detect.add_detect_args(parser)
+log_detect.detect(logs, 'username', args)
+"""
+
+from collections import OrderedDict, deque
+from functools import lru_cache
+import calendar
+import sys
+import time
+
+ADDRESS_FIELD = 'ipAddress'
+BUCKETS_PER_WINDOW = 12
+DEFAULT_WINDOW = 10
+DEFAULT_FAILURES = 10
+DEFAULT_SPRAY = 5
+DEFAULT_MAX_KEYS = 100000
+# accounts listed in a spray alert
+SHOWN_ACCOUNTS = 5
+
+
+def add_detect_args(parser):
+    parser.add_argument('--detect', action='store_true', help='Print brute-force and password spray alerts instead of the logs')
+    parser.add_argument('--window', type=int, default=DEFAULT_WINDOW, help='Sliding window of --detect in minutes')
+    parser.add_argument('--failures', type=int, default=DEFAULT_FAILURES, help='Failures of one account or address within the window that raise an alert')
+    parser.add_argument('--spray', type=int, default=DEFAULT_SPRAY, help='Accounts failing from one address within the window that raise an alert')
+    parser.add_argument('--max-keys', type=int, default=DEFAULT_MAX_KEYS, help='Accounts and addresses --detect keeps counters for')
+
+
+@lru_cache(maxsize=4096)
+def minute_seconds(minute):
+    return calendar.timegm(time.strptime(minute, '%Y-%m-%dT%H:%M'))
+
+
+# Returns the seconds since the epoch of a "YYYY-MM-DDTHH:MM:SSZ" timestamp, each minute is parsed once
+def timestamp_seconds(timestamp):
+    return minute_seconds(timestamp[:16]) + int(timestamp[17:19] or 0)
+
+
+# Counts events per key over the last `buckets` buckets
+class WindowCounter:
+    def __init__(self, buckets, threshold, max_keys=DEFAULT_MAX_KEYS):
+        self.buckets = buckets
+        self.threshold = threshold
+        self.max_keys = max_keys
+        # {key: [total, deque of [bucket, count]]}, least recently seen first
+        self.keys = OrderedDict()
+
+    def count(self, key):
+        entry = self.keys.get(key)
+        return entry[0] if entry else 0
+
+    # Counts an event and returns True when it brings the key's count up to the threshold
+    def add(self, key, bucket):
+        entry = self.keys.get(key)
+        if entry is None:
+            entry = self.keys[key] = [0, deque()]
+            if len(self.keys) > self.max_keys:
+                self.keys.popitem(last=False)
+        else:
+            self.keys.move_to_end(key)
+        counts = entry[1]
+        while counts and counts[0][0] <= bucket - self.buckets:
+            entry[0] -= counts.popleft()[1]
+        before = entry[0]
+        if counts and counts[-1][0] == bucket:
+            counts[-1][1] += 1
+        else:
+            counts.append([bucket, 1])
+        entry[0] += 1
+        return before < self.threshold <= entry[0]
+
+
+# Counts the distinct values seen per key over the last `buckets` buckets. Only the `threshold` most
+# recent values are kept per key, which is all an alert needs.
+class DistinctCounter:
+    def __init__(self, buckets, threshold, max_keys=DEFAULT_MAX_KEYS):
+        self.buckets = buckets
+        self.threshold = threshold
+        self.max_keys = max_keys
+        # {key: OrderedDict of {value: last bucket}}, least recently seen first
+        self.keys = OrderedDict()
+
+    def values(self, key):
+        return list(self.keys.get(key, ()))
+
+    # Records a value and returns True when it brings the key's distinct values up to the threshold
+    def add(self, key, value, bucket):
+        values = self.keys.get(key)
+        if values is None:
+            values = self.keys[key] = OrderedDict()
+            if len(self.keys) > self.max_keys:
+                self.keys.popitem(last=False)
+        else:
+            self.keys.move_to_end(key)
+        while values and next(iter(values.values())) <= bucket - self.buckets:
+            values.popitem(last=False)
+        before = len(values)
+        values[value] = bucket
+        values.move_to_end(value)
+        if len(values) > self.threshold:
+            values.popitem(last=False)
+        return before < self.threshold <= len(values)
+
+
+class Detector:
+    def __init__(self, account_field, window=DEFAULT_WINDOW, failures=DEFAULT_FAILURES, spray=DEFAULT_SPRAY,
+                 max_keys=DEFAULT_MAX_KEYS):
+        self.account_field = account_field
+        self.window = window
+        self.bucket_seconds = max(1, window * 60 // BUCKETS_PER_WINDOW)
+        self.accounts = WindowCounter(BUCKETS_PER_WINDOW, failures, max_keys)
+        self.addresses = WindowCounter(BUCKETS_PER_WINDOW, failures, max_keys)
+        self.sprays = DistinctCounter(BUCKETS_PER_WINDOW, spray, max_keys)
+        self.records = 0
+        self.failures = 0
+        self.alerts = 0
+
+    # Returns the alerts raised by one record, as lines of text
+    def check(self, log):
+        self.records += 1
+        if log.get('success', True):
+            return []
+        self.failures += 1
+        timestamp = log['timestamp']
+        bucket = timestamp_seconds(timestamp) // self.bucket_seconds
+        account = log.get(self.account_field)
+        address = log.get(ADDRESS_FIELD)
+        alerts = []
+        if account is not None and self.accounts.add(account, bucket):
+            alerts.append('{} brute-force {}={}: {} failures in {} minutes'.format(
+                timestamp, self.account_field, account, self.accounts.count(account), self.window))
+        if address is not None:
+            if self.addresses.add(address, bucket):
+                alerts.append('{} flood {}={}: {} failures in {} minutes'.format(
+                    timestamp, ADDRESS_FIELD, address, self.addresses.count(address), self.window))
+            if account is not None and self.sprays.add(address, account, bucket):
+                accounts = self.sprays.values(address)
+                alerts.append('{} spray {}={}: {} accounts failed in {} minutes: {}{}'.format(
+                    timestamp, ADDRESS_FIELD, address, len(accounts), self.window,
+                    ', '.join(map(str, accounts[-SHOWN_ACCOUNTS:])), ', ...' if len(accounts) > SHOWN_ACCOUNTS else ''))
+        self.alerts += len(alerts)
+        return alerts
+
+
+# Prints alerts as the logs stream in, `account_field` is the field naming the account that authenticated
+def detect(logs, account_field, args, stream=sys.stdout):
+    detector = Detector(account_field, args.window, args.failures, args.spray, args.max_keys)
+    for log in logs:
+        for alert in detector.check(log):
+            print(alert, file=stream, flush=True)
+    print('Checked {} records, {} failures, {} alerts'.format(detector.records, detector.failures, detector.alerts), file=stream)
+    return detector.alerts
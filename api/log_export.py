@@ -0,0 +1,165 @@
+"""
+Streaming export of the log scripts' --csv and --jsonl output.
+
+Rows go through a text stream into the compressor and a BUFFER_SIZE file buffer, so the disk is
+written a megabyte at a time instead of once per record. The file is compressed with gzip or zstd
+when --compress asks for it or the name ends in .gz or .zst.
+
+Long exports can be split into shards, either once a shard holds --rotate-size MB on disk or at
+every hour or day of the logs' timestamps with --rotate. Shards are named after the export, e.g.
+radius.csv.gz becomes radius.00001.csv.gz, radius.00002.csv.gz... or radius.2024-05-01T13.csv.gz,
+and every CSV shard starts with the header so each one can be read on its own.
+
+A shard is written as <name>.part and renamed when it is complete, so files without .part are always
+whole. Shards are also completed when the script fails or is interrupted, and flush() makes
+everything written so far readable, which --follow does after every poll.
+
+Required packages:
+pip install zstandard (only for --compress zstd)
+
+Usage:
+log_export.add_export_args(parser)
+with log_export.open_export(args, header, row) as export:
+    export.write(log)
+"""
+
+from contextlib import nullcontext
+import csv
+import gzip
+import io
+import json
+import os
+import sys
+
+BUFFER_SIZE = 1024 * 1024
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+COMPRESSIONS = ('none', 'gzip', 'zstd')
+SUFFIXES = {'.gz': 'gzip', '.zst': 'zstd'}
+# length of the timestamp prefix naming a shard: YYYY-MM-DDTHH or YYYY-MM-DD
+ROTATIONS = {'hour': 13, 'day': 10}
+
+
+def add_export_args(parser):
+    formats = parser.add_mutually_exclusive_group()
+    formats.add_argument('--csv', help='Export a CSV of the log data to the specified filename and path')
+    formats.add_argument('--jsonl', help='Export the log records as JSON lines to the specified filename and path')
+    parser.add_argument('--compress', choices=COMPRESSIONS, help='Compress the export, by default gzip for .gz names, zstd for .zst names and none otherwise')
+    rotations = parser.add_mutually_exclusive_group()
+    rotations.add_argument('--rotate-size', type=float, help='Start a new export shard once a shard holds this many MB')
+    rotations.add_argument('--rotate', choices=list(ROTATIONS), help='Start a new export shard for every hour or day of logs')
+
+
+# Returns the compression of an export, from --compress or else from the name
+def compression(path, compress=None):
+    if compress:
+        return compress
+    return SUFFIXES.get(os.path.splitext(path)[1], 'none')
+
+
+# Returns the name of a shard, the shard id goes before the extensions
+def shard_path(path, shard):
+    directory, name = os.path.split(path)
+    stem, dot, suffixes = name.partition('.')
+    return os.path.join(directory, '{}.{}{}{}'.format(stem, shard, dot, suffixes))
+
+
+def open_compressed(path, compress):
+    raw = open(path, 'wb', buffering=BUFFER_SIZE)
+    if compress == 'gzip':
+        return raw, gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=GZIP_LEVEL)
+    if compress == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raw.close()
+            os.remove(path)
+            sys.exit('--compress zstd requires zstandard: pip install zstandard')
+        return raw, zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(raw)
+    return raw, raw
+
+
+class Export:
+    # `header` and `row` give the CSV columns and turn a record into a CSV row, JSON lines are the records
+    def __init__(self, path, jsonl=False, header=None, row=None, compress=None, rotate_size=None, rotate=None):
+        self.path = path
+        self.jsonl = jsonl
+        self.header = header
+        self.row = row
+        self.compress = compression(path, compress)
+        self.rotate_size = int(rotate_size * 1024 * 1024) if rotate_size else None
+        self.rotate_length = ROTATIONS[rotate] if rotate else None
+        self.shard = None
+        self.shards = []
+        self.bucket = None
+        self.raw = None
+        self.file = None
+        self.writer = None
+        self.records = 0
+
+    def open_shard(self, shard=None):
+        self.shard = shard_path(self.path, shard) if shard else self.path
+        self.raw, compressed = open_compressed(self.shard + '.part', self.compress)
+        self.file = io.TextIOWrapper(compressed, encoding='utf-8', newline='')
+        self.writer = csv.writer(self.file)
+        if self.header and not self.jsonl:
+            self.writer.writerow(self.header)
+
+    def close_shard(self):
+        self.file.close()
+        # gzip leaves the file it wrote to open
+        self.raw.close()
+        os.replace(self.shard + '.part', self.shard)
+        self.shards.append(self.shard)
+        self.file = None
+
+    def write(self, log):
+        if self.rotate_length:
+            bucket = log['timestamp'][:self.rotate_length]
+            if bucket != self.bucket:
+                if self.file:
+                    self.close_shard()
+                self.bucket = bucket
+                self.open_shard(bucket)
+        elif not self.file:
+            self.open_shard('{:05d}'.format(len(self.shards) + 1) if self.rotate_size else None)
+
+        if self.jsonl:
+            self.file.write(json.dumps(log) + '\n')
+        else:
+            self.writer.writerow(self.row(log))
+        self.records += 1
+        # tell() is the file's position, buffered bytes included, so checking every record costs nothing
+        if self.rotate_size and self.raw.tell() >= self.rotate_size:
+            self.close_shard()
+
+    # Makes everything written so far readable from the .part file
+    def flush(self):
+        if self.file:
+            self.file.flush()
+            self.raw.flush()
+
+    def close(self):
+        # an export without records still gets its file, with the CSV header
+        if not self.file and not self.shards and not self.rotate_length:
+            self.open_shard('00001' if self.rotate_size else None)
+        if self.file:
+            self.close_shard()
+        if len(self.shards) == 1:
+            print('Exported {} records to {}'.format(self.records, self.shards[0]))
+        elif self.shards:
+            print('Exported {} records to {} shards, {} to {}'.format(self.records, len(self.shards), self.shards[0], self.shards[-1]))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Returns the export asked for by --csv or --jsonl, or an empty context when there is none
+def open_export(args, header, row):
+    path = args.jsonl or args.csv
+    if not path:
+        return nullcontext()
+    return Export(path, bool(args.jsonl), header, row, args.compress, args.rotate_size, args.rotate)
@@ -0,0 +1,102 @@
+"""
+Shared page fetcher for the Foxpass log scripts (LDAP, Event and RADIUS).
+
+Pages are requested in parallel over the keep-alive connection pool of a
+foxpass.FoxpassClient and are handed back in page order, so records still come
+out in ascending timestamp order. Records are streamed as soon as their page
+arrives rather than collected up front.
+
+Required packages:
+pip install requests
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import queue
+import threading
+
+DEFAULT_CONCURRENCY = 8
+
+
+# Fetches the logs of one window. Nothing touches the network until the page count or the
+# records are first needed, and the page count is computed for this exact window.
+class LogClient:
+    def __init__(self, client, endpoint, start, end, concurrency=DEFAULT_CONCURRENCY):
+        self.client = client
+        self.endpoint = endpoint
+        self.start = start
+        self.end = end
+        self.concurrency = max(1, concurrency)
+        self._num_pages = None
+        self._first_page = None
+
+    # Returns the number of pages Foxpass holds for the window. It comes with the first page, which
+    # is kept for iter_pages, so a window of one page costs one request.
+    @property
+    def num_pages(self):
+        if self._num_pages is None:
+            request = self.request_page(1)
+            if "numPages" in request:
+                self._first_page = request["data"]
+            else:
+                request = self.query()
+            self._num_pages = request["numPages"]
+        return self._num_pages
+
+    # Log queries only read, so they are retried on server and connection errors like a GET, and
+    # an error that outlasts the retries is raised instead of being read as a page
+    def query(self, **fields):
+        r = self.client.post(self.endpoint, json=dict({"from": self.start, "to": self.end}, **fields), idempotent=True)
+        r.raise_for_status()
+        return r.json()
+
+    def request_page(self, page):
+        return self.query(page=page, ascending=True)
+
+    # Pulls a single page of logs, pages are numbered from 1
+    def fetch_page(self, page):
+        if page == 1 and self._first_page is not None:
+            first_page, self._first_page = self._first_page, None
+            return first_page
+        return self.request_page(page)["data"]
+
+    # Pulls every page in parallel and yields them in page order. At most `concurrency` pages are
+    # in flight or waiting to be consumed, so memory stays flat however long the window is.
+    def iter_pages(self):
+        pages = self.num_pages
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            pending = deque()
+            next_page = 1
+            while next_page <= pages or pending:
+                while next_page <= pages and len(pending) < self.concurrency:
+                    pending.append(pool.submit(self.fetch_page, next_page))
+                    next_page += 1
+                yield pending.popleft().result()
+
+    # Yields individual log records in ascending timestamp order
+    def iter_logs(self):
+        for page in self.iter_pages():
+            yield from page
+
+
+# Iterates `pages` on a background thread, so that several windows or endpoints are fetched at the
+# same time. At most `size` pages wait to be consumed, errors are raised to the consumer.
+def prefetch(pages, size=DEFAULT_CONCURRENCY):
+    ready = queue.Queue(maxsize=max(1, size))
+
+    def produce():
+        try:
+            for page in pages:
+                ready.put((page, None))
+            ready.put((None, None))
+        except Exception as e:
+            ready.put((None, e))
+
+    threading.Thread(target=produce, daemon=True).start()
+    while True:
+        page, error = ready.get()
+        if error is not None:
+            raise error
+        if page is None:
+            return
+        yield page
@@ -0,0 +1,107 @@
+"""
+Filter engine shared by the Foxpass log scripts (LDAP, Event and RADIUS).
+
+Filters given on the command line are compiled once into a plain Python predicate, so nothing is
+evaluated as source code and each record costs a few field comparisons.
+
+Each filter option can be given more than once and a record matches the option if it matches any of
+its values. A value is either compared exactly or, when prefixed with re:, searched as a regular
+expression, e.g. --bind_dn re:^uid=svc- --bind_dn uid=admin,dc=example,dc=com
+
+Options are combined with AND by default, or with OR when the filter is built with match_any.
+"""
+
+from operator import itemgetter
+import re
+
+REGEX_PREFIX = 're:'
+
+
+# Converts a True/False command line value into a boolean
+def parse_bool(value):
+    if value.lower() in ('true', '1', 'yes'):
+        return True
+    if value.lower() in ('false', '0', 'no'):
+        return False
+    raise ValueError('Expected True or False, got {}'.format(value))
+
+
+class Clause:
+    def __init__(self, field, values, cast=str):
+        self.field = field
+        self.patterns = [re.compile(value[len(REGEX_PREFIX):]) for value in values if value.startswith(REGEX_PREFIX)]
+        self.values = frozenset(cast(value) for value in values if not value.startswith(REGEX_PREFIX))
+        self.exact = not self.patterns and len(self.values) == 1
+
+    def predicate(self):
+        get = itemgetter(self.field)
+        values = self.values
+        if self.exact:
+            value, = values
+            return lambda log: get(log) == value
+        if not self.patterns:
+            return lambda log: get(log) in values
+        searches = [pattern.search for pattern in self.patterns]
+
+        def match(log):
+            value = get(log)
+            return value in values or any(search(str(value)) for search in searches)
+        return match
+
+
+class Filter:
+    def __init__(self, clauses, match_any=False):
+        self.clauses = clauses
+        self.match_any = match_any
+
+    def __bool__(self):
+        return bool(self.clauses)
+
+    # Returns a predicate taking a log record, exact matches are checked with a single tuple comparison
+    def compile(self):
+        if self.match_any:
+            return any_of([clause.predicate() for clause in self.clauses])
+
+        exact = [clause for clause in self.clauses if clause.exact]
+        others = [clause.predicate() for clause in self.clauses if not clause.exact]
+        if exact:
+            get = itemgetter(*[clause.field for clause in exact])
+            target = tuple(next(iter(clause.values)) for clause in exact)
+            target = target if len(exact) > 1 else target[0]
+            others.insert(0, lambda log: get(log) == target)
+        return all_of(others)
+
+
+# Chains predicates with short-circuiting closures, which is cheaper per record than all() over a generator
+def all_of(predicates):
+    first = predicates[0]
+    if len(predicates) == 1:
+        return first
+    rest = all_of(predicates[1:])
+    return lambda log: first(log) and rest(log)
+
+
+def any_of(predicates):
+    first = predicates[0]
+    if len(predicates) == 1:
+        return first
+    rest = any_of(predicates[1:])
+    return lambda log: first(log) or rest(log)
+
+
+# Yields the records matching the filter, or every record when the filter is empty
+def select(records, query):
+    if not query:
+        yield from records
+        return
+    matches = query.compile()
+    for record in records:
+        if matches(record):
+            yield record
+
+
+# Builds a filter from (field, values) pairs, pairs without values are skipped
+def build_filter(fields, match_any=False, casts=None):
+    casts = casts or {}
+    clauses = [Clause(field, values, casts.get(field, str)) for field, values in fields if values]
+    return Filter(clauses, match_any)
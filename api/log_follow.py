@@ -0,0 +1,59 @@
+"""
+--follow mode of the LDAP and RADIUS log scripts: keep printing new logs as they arrive, like tail -f.
+
+An in-memory log_store.LogCursor sits on the newest record seen. Each poll asks only for the window
+from the cursor's minute until now, which is usually a single page, and the records of that minute
+already seen are dropped, so nothing is printed twice at window boundaries.
+
+The poll interval halves, down to --min-interval, after every poll that found new records, and
+doubles, up to --max-interval, after every idle one. Bursts of activity are shown within seconds
+while an idle directory costs one request every --max-interval.
+
+Usage:
+log_follow.add_follow_args(parser)
+logs = log_follow.follow(client, 'logs/radius/', start, args)
+"""
+
+from datetime import datetime, timezone
+import time
+
+import log_fetcher
+import log_store
+
+DEFAULT_MIN_INTERVAL = 2.0
+DEFAULT_MAX_INTERVAL = 60.0
+
+
+def add_follow_args(parser):
+    parser.add_argument('--follow', action='store_true', help='Keep polling for new logs and print them as they arrive, until interrupted')
+    parser.add_argument('--min-interval', type=float, default=DEFAULT_MIN_INTERVAL, help='Shortest wait between --follow polls in seconds, used while logs keep arriving')
+    parser.add_argument('--max-interval', type=float, default=DEFAULT_MAX_INTERVAL, help='Longest wait between --follow polls in seconds, reached while no logs arrive')
+
+
+# Returns the next poll interval, shorter after activity and longer while idle
+def next_interval(interval, new_records, min_interval, max_interval):
+    if new_records:
+        return max(min_interval, interval / 2)
+    return min(max_interval, interval * 2)
+
+
+# Yields the records from `start` on and then every new record as it arrives, oldest first, until
+# interrupted. `on_poll` callables run after each poll, e.g. to flush the output or save progress.
+def follow(client, endpoint, start, args, on_poll=(), sleep=time.sleep):
+    cursor = log_store.LogCursor()
+    interval = args.min_interval
+    try:
+        while True:
+            end = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%MZ')
+            new_records = 0
+            for log in log_fetcher.LogClient(client, endpoint, cursor.start(start), end, args.concurrency).iter_logs():
+                if cursor.is_new(log):
+                    cursor.advance(log)
+                    new_records += 1
+                    yield log
+            for callback in on_poll:
+                callback()
+            interval = next_interval(interval, new_records, args.min_interval, args.max_interval)
+            sleep(interval)
+    except KeyboardInterrupt:
+        return
@@ -0,0 +1,138 @@
+"""
+Local state for incremental log syncs, used by the --since-last-run option of the log scripts.
+
+LogCursor keeps the timestamp and ids of the newest records seen by the previous run in a small JSON
+state file, so the next run only asks Foxpass for the range after them. LogStore appends the new
+records to a local JSON lines file, so repeated runs build up a full local copy of the logs.
+"""
+
+import hashlib
+import json
+import os
+
+STATE_DIR = os.path.join(os.path.expanduser('~'), '.foxpass')
+CHECKPOINT_EVERY = 1000
+
+
+def default_path(filename):
+    return os.path.join(STATE_DIR, filename)
+
+
+def make_parent_dir(path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+
+# Returns a stable id for a record, falling back to a hash of its content when it has no id
+def record_key(log):
+    if 'id' in log:
+        return str(log['id'])
+    return hashlib.sha1(json.dumps(log, sort_keys=True).encode()).hexdigest()
+
+
+# Without a path the cursor only lives in memory, for de-duplicating within one run
+class LogCursor:
+    def __init__(self, path=None):
+        self.path = path
+        self.timestamp = None
+        self.keys = set()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            self.timestamp = state['timestamp']
+            self.keys = set(state['keys'])
+
+    # Returns the "from" value for the next request, the API works in whole minutes so the minute of
+    # the last record is fetched again and de-duplicated with is_new()
+    def start(self, default):
+        if self.timestamp is None:
+            return default
+        return self.timestamp[:16] + 'Z'
+
+    def is_new(self, log):
+        if self.timestamp is None or log['timestamp'] > self.timestamp:
+            return True
+        return log['timestamp'] == self.timestamp and record_key(log) not in self.keys
+
+    def advance(self, log):
+        if log['timestamp'] != self.timestamp:
+            self.timestamp = log['timestamp']
+            self.keys = set()
+        self.keys.add(record_key(log))
+
+    def save(self):
+        make_parent_dir(self.path)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'timestamp': self.timestamp, 'keys': sorted(self.keys)}, f)
+        os.replace(tmp_path, self.path)
+
+
+class LogStore:
+    def __init__(self, path):
+        make_parent_dir(path)
+        self.file = open(path, 'a')
+
+    def append(self, log):
+        self.file.write(json.dumps(log) + '\n')
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Reads back a store written by LogStore, for the query subcommand
+class LogStoreReader:
+    def __init__(self, path):
+        self.path = path
+
+    # Yields the stored records in the order they were synced, which is ascending timestamp order.
+    # The filter is left to the caller's predicate, like LogArchive.query does for regular expressions.
+    def query(self, query=None, start=None, end=None):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path) as f:
+            for line in f:
+                log = json.loads(line)
+                # windows are whole minutes, so compare on the minute prefix of the timestamp
+                if start and log['timestamp'][:16] < start[:16]:
+                    continue
+                if end and log['timestamp'][:16] > end[:16]:
+                    continue
+                yield log
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Passes through only the records newer than the cursor, appending them to the store. The store is
+# flushed before the cursor is saved, so an interrupted run never skips records on the next one.
+def sync(logs, cursor, store, checkpoint_every=CHECKPOINT_EVERY):
+    count = 0
+    try:
+        for log in logs:
+            if not cursor.is_new(log):
+                continue
+            store.append(log)
+            cursor.advance(log)
+            count += 1
+            if count % checkpoint_every == 0:
+                store.flush()
+                cursor.save()
+            yield log
+    finally:
+        store.flush()
+        cursor.save()
@@ -0,0 +1,146 @@
+"""
+--summary mode of the log scripts: aggregate the matching logs instead of printing them.
+
+Records are read in chunks of CHUNK_SIZE into pandas DataFrames and every aggregate is computed with
+vectorized group-bys on the chunk, then added to the running totals. Only the totals are kept, so
+memory depends on the number of distinct values and time buckets, not on the number of records.
+
+The summary shows the number of records and failures, the top --top values of each key field with
+their success ratio, the records and failures per time bucket (--bucket, e.g. 15min, 1h, 1D) and,
+for the top failing values of each key field, their failures per bucket.
+
+Required packages:
+pip install pandas numpy
+
+Usage:
+log_summary.add_summary_args(parser)
+log_summary.summarize(logs, ['bindDn', 'type'], 'success', args)
+"""
+
+from itertools import islice
+import sys
+
+CHUNK_SIZE = 100000
+DEFAULT_TOP = 10
+DEFAULT_BUCKET = '1h'
+
+
+def add_summary_args(parser):
+    parser.add_argument('--summary', action='store_true', help='Print counts, success ratios, top values and a histogram instead of the logs (requires pandas)')
+    parser.add_argument('--top', type=int, default=DEFAULT_TOP, help='How many values --summary lists per field')
+    parser.add_argument('--bucket', default=DEFAULT_BUCKET, help='Time bucket of the --summary histogram, e.g. 15min, 1h or 1D')
+
+
+def import_pandas():
+    try:
+        import pandas
+    except ImportError:
+        sys.exit('--summary requires pandas: pip install pandas numpy')
+    return pandas
+
+
+# Yields lists of up to `size` records
+def chunks(logs, size=CHUNK_SIZE):
+    logs = iter(logs)
+    while True:
+        chunk = list(islice(logs, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# Adds two aggregates, either of which may not exist yet
+def combine(total, part):
+    return part if total is None else total.add(part, fill_value=0)
+
+
+class Summary:
+    def __init__(self, keys, success_field=None, bucket=DEFAULT_BUCKET):
+        self.pd = import_pandas()
+        self.keys = keys
+        self.success_field = success_field
+        self.bucket = bucket
+        self.bucket_seconds = int(self.pd.Timedelta(bucket).total_seconds())
+        self.records = 0
+        self.failures = 0
+        self.first = None
+        self.last = None
+        # {key field: DataFrame of records and failures indexed by value}
+        self.by_key = dict.fromkeys(keys)
+        # records and failures indexed by time bucket
+        self.by_bucket = None
+        # {key field: failures indexed by (value, time bucket)}
+        self.failures_by_key_bucket = dict.fromkeys(keys)
+
+    def add(self, logs):
+        pd = self.pd
+        columns = ['timestamp'] + self.keys + ([self.success_field] if self.success_field else [])
+        frame = pd.DataFrame.from_records(logs, columns=columns)
+        # numpy parses the timestamps without their Z several times faster than pandas parses the format
+        seconds = frame['timestamp'].to_numpy(dtype='U19').astype('datetime64[s]').astype('int64')
+        frame['bucket'] = pd.to_datetime(seconds // self.bucket_seconds * self.bucket_seconds, unit='s', utc=True)
+        if self.success_field:
+            frame['failed'] = ~frame[self.success_field].fillna(False).astype(bool)
+        else:
+            frame['failed'] = False
+
+        self.records += len(frame)
+        self.failures += int(frame['failed'].sum())
+        first, last = frame['timestamp'].min(), frame['timestamp'].max()
+        self.first = first if self.first is None else min(self.first, first)
+        self.last = last if self.last is None else max(self.last, last)
+
+        counts = frame.groupby('bucket')['failed'].agg(records='size', failures='sum')
+        self.by_bucket = combine(self.by_bucket, counts)
+        failed = frame[frame['failed']]
+        for key in self.keys:
+            counts = frame.groupby(key, sort=False)['failed'].agg(records='size', failures='sum')
+            self.by_key[key] = combine(self.by_key[key], counts)
+            if self.success_field:
+                counts = failed.groupby([key, 'bucket'], sort=False).size()
+                self.failures_by_key_bucket[key] = combine(self.failures_by_key_bucket[key], counts)
+
+    def report(self, top=DEFAULT_TOP, stream=sys.stdout):
+        if not self.records:
+            print('No logs to summarize', file=stream)
+            return
+        print('{} records from {} to {}'.format(self.records, self.first, self.last), file=stream)
+        if self.success_field:
+            print('{} failed ({:.1%})'.format(self.failures, self.failures / self.records), file=stream)
+
+        for key in self.keys:
+            counts = self.by_key[key].astype('int64')
+            if self.success_field:
+                counts['success_ratio'] = (1 - counts['failures'] / counts['records']).round(3)
+            else:
+                counts = counts.drop(columns='failures')
+            print('\nTop {} {} by records'.format(top, key), file=stream)
+            print(counts.nlargest(top, 'records').to_string(), file=stream)
+            if self.success_field:
+                print('\nTop {} {} by failures'.format(top, key), file=stream)
+                print(counts[counts['failures'] > 0].nlargest(top, 'failures').to_string(), file=stream)
+
+        counts = self.by_bucket.astype('int64').sort_index()
+        if not self.success_field:
+            counts = counts.drop(columns='failures')
+        print('\nRecords per {}'.format(self.bucket), file=stream)
+        print(counts.to_string(), file=stream)
+
+        if self.success_field:
+            for key in self.keys:
+                failures = self.failures_by_key_bucket[key]
+                if failures is None or failures.empty:
+                    continue
+                worst = self.by_key[key].nlargest(top, 'failures').index
+                failures = failures[failures.index.get_level_values(0).isin(worst)].astype('int64').sort_index()
+                print('\nFailures per {} per {} for the top {} {}'.format(key, self.bucket, top, key), file=stream)
+                print(failures.rename('failures').to_string(), file=stream)
+
+
+# Prints the summary of the logs, `keys` are the fields to group by and `success_field` the field
+# telling whether the request succeeded, if the logs have one
+def summarize(logs, keys, success_field, args, stream=sys.stdout):
+    summary = Summary(keys, success_field, args.bucket)
+    for chunk in chunks(logs):
+        summary.add(chunk)
+    summary.report(args.top, stream)
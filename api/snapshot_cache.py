@@ -0,0 +1,152 @@
+"""
+On-disk cache of the user and group lists, shared by the scripts that read the whole directory.
+
+Chained runs of list_users, list_groups, user_cleanup and deactivate_standard_users download each list
+once: a cached list is revalidated with If-None-Match / If-Modified-Since when the API sent an ETag
+or Last-Modified, so an unchanged list costs a 304 instead of a full download. The list scripts can
+skip the check for --cache-ttl seconds, the scripts that deactivate users always make it. --refresh
+always downloads, and every script that changes users or groups drops the lists cached in its
+--cache-dir so the next script sees the change.
+
+Each list is kept under ~/.foxpass/cache as a JSON lines file of records next to a small JSON file
+of metadata, keyed by API url, token and endpoint and readable only by their owner. Records are
+streamed to and from the file one at a time, so reading through the cache never holds the whole list.
+
+Usage:
+snapshot_cache.add_cache_args(parser)
+cache = snapshot_cache.cache_from_args(args)
+users = directory.users(client, cache)
+"""
+
+import hashlib
+import json
+import os
+import time
+
+import directory
+import log_store
+
+DEFAULT_DIR = log_store.default_path('cache')
+DEFAULT_TTL = 0
+NOT_MODIFIED = 304
+
+
+# Opens a file for writing that only its owner can read
+def open_private(path):
+    return open(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w')
+
+
+class SnapshotCache:
+    def __init__(self, cache_dir=DEFAULT_DIR, ttl=DEFAULT_TTL, refresh=False):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.refresh = refresh
+
+    # Returns the path of the entry without an extension
+    def path(self, client, endpoint):
+        key = '\n'.join([client.api_url, client.headers['Authorization'], endpoint])
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode()).hexdigest())
+
+    def load_meta(self, path):
+        try:
+            with open(path + '.json') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save_meta(self, path, meta):
+        with open_private(path + '.json.tmp') as f:
+            json.dump(meta, f)
+        os.replace(path + '.json.tmp', path + '.json')
+
+    def read_records(self, path):
+        with open(path + '.jsonl') as f:
+            for line in f:
+                yield json.loads(line)
+
+    # Yields the records while writing them to the entry, which only replaces the old one once the
+    # whole list has been read
+    def write_records(self, path, records):
+        log_store.make_parent_dir(path)
+        tmp_path = path + '.jsonl.tmp'
+        try:
+            with open_private(tmp_path) as f:
+                for record in records:
+                    f.write(json.dumps(record) + '\n')
+                    yield record
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        os.replace(tmp_path, path + '.jsonl')
+
+    # Yields the records of a list endpoint from the cache when it is fresh, otherwise from the API,
+    # raising requests' HTTPError when a request fails
+    def iter(self, client, endpoint):
+        path = self.path(client, endpoint)
+        meta = None if self.refresh else self.load_meta(path)
+        if meta and not os.path.exists(path + '.jsonl'):
+            meta = None
+        if meta and time.time() - meta['fetched'] < self.ttl:
+            yield from self.read_records(path)
+            return
+
+        headers = {}
+        if meta and meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta and meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        r = directory.get_page(client, endpoint, headers=headers)
+        if r.status_code == NOT_MODIFIED and meta:
+            r.close()
+            meta['fetched'] = time.time()
+            self.save_meta(path, meta)
+            yield from self.read_records(path)
+            return
+
+        # the old metadata must not describe the new records if this run dies half way
+        self.invalidate(client, endpoint)
+        pages = {}
+        yield from self.write_records(path, directory.iter_data(client, endpoint, first=r, meta=pages))
+        # the validators of the first page only vouch for the whole list when it has no other pages
+        single_page = pages.get('numPages', 1) == 1
+        self.save_meta(path, {
+            'fetched': time.time(),
+            'etag': r.headers.get('ETag') if single_page else None,
+            'last_modified': r.headers.get('Last-Modified') if single_page else None,
+        })
+
+    def get(self, client, endpoint):
+        return list(self.iter(client, endpoint))
+
+    # Drops the cached list, call after changing what it lists
+    def invalidate(self, client, endpoint):
+        try:
+            os.remove(self.path(client, endpoint) + '.json')
+        except FileNotFoundError:
+            pass
+
+
+# Drops the cached user and group lists, called by every script that changes users or groups
+def invalidate_lists(client, cache_dir=DEFAULT_DIR):
+    cache = SnapshotCache(cache_dir)
+    for endpoint in (directory.USERS_ENDPOINT, directory.GROUPS_ENDPOINT):
+        cache.invalidate(client, endpoint)
+
+
+# Adds --cache-dir, which the scripts that change users or groups take too so that they drop the lists
+# cached wherever the reading scripts keep them
+def add_cache_dir_arg(parser):
+    parser.add_argument('--cache-dir', default=DEFAULT_DIR, help='Directory of the cached user and group lists')
+
+
+# Adds the cache arguments to the scripts that read the user or group list. Scripts that act on
+# the list pass ttl=False so that it is always revalidated.
+def add_cache_args(parser, ttl=True):
+    if ttl:
+        parser.add_argument('--cache-ttl', type=float, default=DEFAULT_TTL, help='Seconds a cached user or group list is used without asking the API, by default it is always revalidated')
+    add_cache_dir_arg(parser)
+    parser.add_argument('--refresh', action='store_true', help='Ignore the cache and download the lists again')
+
+
+def cache_from_args(args):
+    return SnapshotCache(args.cache_dir, getattr(args, 'cache_ttl', 0), args.refresh)
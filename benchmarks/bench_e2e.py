@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+
+"""
+Runs the api/ scripts end to end against the local mock API at growing directory sizes, to see how
+long the runbooks take as the directory grows and to catch regressions.
+
+For every size the mock starts with that many users (one group per 20 users) and ten log records
+per user. Each script runs in its own process and is measured for wall time, number of requests
+the mock served, peak RSS and requests per second. The scripts run in order against the same mock:
+list_users, list_groups, create_users (adds as many users again), copy_group, remove_abandoned_users
+(deactivates the users just created), user_cleanup and the three log fetchers. Every script runs
+with the client's rate limit off (--rate 0).
+
+The default sizes are 1000 and 10000 users, which take about a minute. 100000 users is opt-in with
+--sizes, it takes several minutes and most of it is spent in the mock.
+
+Results are written to a JSON file. With --baseline, they are compared to an earlier results file
+and the benchmark exits with status 1 when a script got slower or bigger than --tolerance allows, or
+made more requests than REQUEST_TOLERANCE allows, which is how an N+1 loop shows up.
+baseline.json next to this script holds the results of a run at all three sizes, compare against it
+after changing a script, and rewrite it with --output when a change is meant to move the numbers.
+Timings depend on the machine, so a baseline is best regenerated on the machine that compares.
+
+Required packages:
+pip install requests
+
+To run:
+python bench_e2e.py --output results.json
+python bench_e2e.py --sizes 1000 10000 100000 --output results.json
+python bench_e2e.py --baseline baseline.json
+python bench_e2e.py --sizes 1000 10000 100000 --output baseline.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import mock_foxpass
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api')
+USERS_PER_GROUP = 20
+LOG_RECORDS_PER_USER = 10
+# request counts don't depend on the machine, only the log windows move by a page between runs
+REQUEST_TOLERANCE = 0.01
+LOG_SCRIPTS = ['foxpass_ldap_logs', 'foxpass_event_logs', 'foxpass_radius_logs']
+# Runs a script and writes its peak RSS in KB to the file given before it. The ru_maxrss of a child
+# also counts the benchmark it was forked from, which holds the mock, VmHWM only counts the script.
+RUNNER = '''
+import atexit, runpy, sys
+def save_peak_rss(path=sys.argv.pop(1)):
+    with open('/proc/self/status') as status, open(path, 'w') as out:
+        out.write(next(line.split()[1] for line in status if line.startswith('VmHWM:')))
+atexit.register(save_peak_rss)
+sys.argv.pop(0)
+runpy.run_path(sys.argv[0], run_name='__main__')
+'''
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Benchmark the api/ scripts end to end against the mock API')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000], help='Directory sizes in users')
+    parser.add_argument('--latency', type=float, default=0.0, help='Simulated server latency per request in seconds')
+    parser.add_argument('--workers', type=int, default=32, help='Workers for the scripts that take --workers')
+    parser.add_argument('--output', default='results.json', help='Where to write the results')
+    parser.add_argument('--baseline', help='Earlier results file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed slowdown or RSS growth over the baseline, 0.25 is 25%%')
+    return parser.parse_args()
+
+
+# Returns (name, command) for every script, in the order they run
+def commands(url, size, workers, tmp):
+    api = ['--api-key', 'bench', '--api-url', url, '--rate', '0']
+    cache = ['--cache-dir', os.path.join(tmp, 'cache'), '--refresh']
+    csv_path = os.path.join(tmp, 'users.csv')
+    with open(csv_path, 'w') as f:
+        for i in range(size):
+            f.write('new{0}@example.com,new{0}\n'.format(i))
+    return [
+        ('list_users', ['foxpass_list_users.py'] + api + cache),
+        ('list_groups', ['foxpass_list_groups.py'] + api + cache),
+        ('create_users', ['foxpass_create_users.py'] + api + ['--csv-file', csv_path, '--workers', str(workers),
+                                                              '--output', os.path.join(tmp, 'created.csv')]),
+        ('copy_group', ['foxpass_copy_group.py'] + api + ['--pair', 'group0:group1', '--remove', '--workers', str(workers)]),
+        ('remove_abandoned', ['foxpass_remove_abandoned_users.py'] + api + ['--workers', str(workers)]),
+        ('user_cleanup', ['foxpass_user_cleanup.py'] + api + cache + ['--keep', 'user0', '--workers', str(workers)]),
+    ] + [
+        (script[len('foxpass_'):], [script + '.py'] + api + ['--hours', '168', '--concurrency', '8'])
+        for script in LOG_SCRIPTS
+    ]
+
+
+# Runs a command and returns (wall seconds, peak RSS in KB), failing if it exits with an error
+def run(command, tmp):
+    rss_path = os.path.join(tmp, 'peak_rss')
+    began = time.perf_counter()
+    subprocess.run([sys.executable, '-c', RUNNER, rss_path] + command, cwd=API_DIR, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    elapsed = time.perf_counter() - began
+    with open(rss_path) as f:
+        return elapsed, int(f.read())
+
+
+def benchmark(size, args):
+    mock = mock_foxpass.MockFoxpass(log_records=size * LOG_RECORDS_PER_USER, latency=args.latency)
+    mock.populate(users=size, groups=max(2, size // USERS_PER_GROUP))
+    server = mock_foxpass.serve(mock)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, command in commands(mock_foxpass.base_url(server), size, args.workers, tmp):
+            requests_before = mock.requests
+            seconds, peak_rss = run(command, tmp)
+            requests = mock.requests - requests_before
+            result = {
+                'script': name,
+                'size': size,
+                'seconds': round(seconds, 3),
+                'requests': requests,
+                'peak_rss_kb': peak_rss,
+                'requests_per_sec': round(requests / seconds, 1),
+            }
+            print('{:<18} {:>8} {:>10.2f} {:>10} {:>12} {:>10.1f}'.format(
+                name, size, seconds, requests, peak_rss, result['requests_per_sec']), flush=True)
+            results.append(result)
+    server.shutdown()
+    return results
+
+
+# Returns a line for every result that is worse than the baseline by more than the tolerance
+def regressions(results, baseline, tolerance):
+    previous = {(result['script'], result['size']): result for result in baseline['results']}
+    found = []
+    for result in results:
+        before = previous.get((result['script'], result['size']))
+        if not before:
+            continue
+        for field, allowed in (('seconds', tolerance), ('peak_rss_kb', tolerance), ('requests', REQUEST_TOLERANCE)):
+            if result[field] > before[field] * (1 + allowed):
+                found.append('{} at {} users: {} went from {} to {}'.format(
+                    result['script'], result['size'], field, before[field], result[field]))
+    return found
+
+
+def main():
+    args = get_args()
+    print('{:<18} {:>8} {:>10} {:>10} {:>12} {:>10}'.format('script', 'users', 'seconds', 'requests', 'peak RSS KB', 'req/sec'))
+    results = []
+    for size in args.sizes:
+        results.extend(benchmark(size, args))
+    with open(args.output, 'w') as f:
+        json.dump({'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()), 'python': sys.version.split()[0],
+                   'latency': args.latency, 'results': results}, f, indent=2)
+    print('Wrote {}'.format(args.output))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        for line in found:
+            print('Regression: ' + line)
+        if found:
+            sys.exit('{} regressions against {}'.format(len(found), args.baseline))
+        print('No regressions against {}'.format(args.baseline))
+
+
+if __name__ == '__main__':
+    main()
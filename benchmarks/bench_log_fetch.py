@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+"""
+Benchmarks the concurrent log page fetcher against the serial page-by-page loop, using the local mock API.
+Reports the time until the first record is streamed and the time for the whole window.
+
+Required packages:
+pip install requests
+
+To run:
+python bench_log_fetch.py --pages 200 --latency 0.05 --concurrency 1 4 8 16
+"""
+
+from datetime import datetime, timedelta, timezone
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api'))
+
+import foxpass
+import log_fetcher
+import mock_foxpass
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Benchmark the log page fetcher')
+    parser.add_argument('--pages', type=int, default=200, help='Number of pages in the window')
+    parser.add_argument('--latency', type=float, default=0.05, help='Simulated server latency per request in seconds')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8, 16], help='Concurrency levels to compare')
+    return parser.parse_args()
+
+
+def main():
+    args = get_args()
+    mock = mock_foxpass.MockFoxpass(log_records=args.pages * mock_foxpass.PAGE_SIZE, latency=args.latency)
+    server = mock_foxpass.serve(mock)
+    start = (datetime.now(timezone.utc) - timedelta(days=7)).strftime('%Y-%m-%dT%H:%MZ')
+    end = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%MZ')
+
+    print('{:>12} {:>10} {:>12} {:>10} {:>8}'.format('concurrency', 'records', 'first (s)', 'total (s)', 'speedup'))
+    baseline = None
+    for concurrency in args.concurrency:
+        began = time.perf_counter()
+        first = None
+        records = 0
+        previous = ''
+        client = foxpass.FoxpassClient('', mock_foxpass.base_url(server), pool_size=concurrency)
+        for log in log_fetcher.LogClient(client, 'logs/ldap/', start, end, concurrency).iter_logs():
+            if first is None:
+                first = time.perf_counter() - began
+            assert log['timestamp'] >= previous, 'records are out of order'
+            previous = log['timestamp']
+            records += 1
+        elapsed = time.perf_counter() - began
+        baseline = baseline or elapsed
+        print('{:>12} {:>10} {:>12.3f} {:>10.2f} {:>7.1f}x'.format(concurrency, records, first, elapsed, baseline / elapsed))
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+"""
+Microbenchmark of the compiled log filter against the eval() filter the log scripts used to build.
+
+No external packages are required.
+
+To run:
+python bench_log_filter.py --records 1000000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api'))
+
+import log_filter
+import mock_foxpass
+
+
+# The query string the RADIUS script used to build, kept here as the baseline
+def eval_query(username=None, outcome=None, location=None):
+    query_string = ""
+    if username != None:
+        query_string += f"log['username']=='{username}' and "
+    if location != None:
+        query_string += f"log['ipAddress']=='{location}' and "
+    if outcome != None:
+        query_string += f"log['success']=={outcome}"
+    if query_string != "":
+        if query_string[-2] == 'd':
+            query_string = query_string[:-5]
+    return query_string
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Benchmark the compiled log filter')
+    parser.add_argument('--records', type=int, default=1000000, help='Number of RADIUS records to filter')
+    return parser.parse_args()
+
+
+def main():
+    args = get_args()
+    mock = mock_foxpass.MockFoxpass(log_records=args.records)
+    logs = [mock.log_record('radius', i) for i in range(args.records)]
+    cases = [
+        ('user', dict(username='user42')),
+        ('user + ip + outcome', dict(username='user42', location='10.0.2.42', outcome='False')),
+    ]
+
+    print('{:<22} {:>8} {:>10} {:>12} {:>8}'.format('filter', 'matches', 'eval (s)', 'compiled (s)', 'speedup'))
+    for name, filters in cases:
+        if_statement = eval_query(**filters)
+        began = time.perf_counter()
+        # the scripts evaluated the statement a second time for every record that did not match
+        expected = sum(1 for log in logs if eval(if_statement) or eval(if_statement))
+        eval_seconds = time.perf_counter() - began
+
+        query = log_filter.build_filter(
+            [(field, [filters[key]] if key in filters else None)
+             for key, field in (('username', 'username'), ('location', 'ipAddress'), ('outcome', 'success'))],
+            casts={'success': log_filter.parse_bool})
+        began = time.perf_counter()
+        matches = query.compile()
+        found = sum(1 for log in logs if matches(log))
+        compiled_seconds = time.perf_counter() - began
+
+        assert found == expected, 'compiled filter found {} records, eval found {}'.format(found, expected)
+        print('{:<22} {:>8} {:>10.2f} {:>12.3f} {:>7.0f}x'.format(name, found, eval_seconds, compiled_seconds, eval_seconds / compiled_seconds))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+"""
+Runs a burst of concurrent requests against the local mock API while it throttles, once with the client's
+rate limiter and retries turned off and then with them on, starting above and below the mock's limit.
+The adaptive client should finish every request at close to the mock's limit from either side, where
+the unthrottled client loses requests to 429s.
+
+Required packages:
+pip install requests
+
+To run:
+python bench_rate_limit.py --requests 400 --rate-limit 40 --workers 16
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api'))
+
+import foxpass
+import mock_foxpass
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Benchmark the adaptive rate limiter against a throttling mock')
+    parser.add_argument('--requests', type=int, default=400, help='Number of requests to send')
+    parser.add_argument('--rate-limit', type=float, default=40, help='Requests per second the mock allows')
+    parser.add_argument('--workers', type=int, default=16, help='Number of threads sending requests')
+    return parser.parse_args()
+
+
+def run(base_url, args, rate, max_retries):
+    client = foxpass.FoxpassClient('', base_url, pool_size=args.workers, rate=rate, max_retries=max_retries)
+    began = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        statuses = list(pool.map(lambda _: client.post('logs/ldap/', json={'page': 1}).status_code, range(args.requests)))
+    elapsed = time.perf_counter() - began
+    client.close()
+    ok = statuses.count(200)
+    return ok, len(statuses) - ok, elapsed
+
+
+def main():
+    args = get_args()
+    print('{:<28} {:>6} {:>7} {:>10} {:>9} {:>10}'.format('client', 'ok', 'failed', 'server 429', 'seconds', 'ok/sec'))
+    modes = [
+        ('no limiter, no retries', 0, 0),
+        ('adaptive, starting 4x above', args.rate_limit * 4, 10),
+        ('adaptive, starting 4x below', args.rate_limit / 4, 10),
+    ]
+    for name, rate, max_retries in modes:
+        mock = mock_foxpass.MockFoxpass(log_records=1000, rate_limit=args.rate_limit)
+        server = mock_foxpass.serve(mock)
+        ok, failed, elapsed = run(mock_foxpass.base_url(server), args, rate, max_retries)
+        server.shutdown()
+        print('{:<28} {:>6} {:>7} {:>10} {:>9.2f} {:>10.1f}'.format(name, ok, failed, mock.throttled, elapsed, ok / elapsed))
+
+
+if __name__ == '__main__':
+    main()
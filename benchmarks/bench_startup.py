@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+
+"""
+Checks that the log scripts start quickly: importing them and running --help must stay under a fixed
+budget and must not load requests or touch the network. Exits with status 1 when a script is over budget.
+
+No external packages are required.
+
+To run:
+python bench_startup.py --budget 0.5
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api')
+SCRIPTS = ['foxpass_ldap_logs', 'foxpass_event_logs', 'foxpass_radius_logs']
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Benchmark the startup time of the log scripts')
+    parser.add_argument('--budget', type=float, default=0.5, help='Maximum seconds allowed for import and for --help')
+    parser.add_argument('--runs', type=int, default=5, help='Runs per measurement, the fastest one is kept')
+    return parser.parse_args()
+
+
+# Returns the fastest wall time of the command, failing if it exits with an error
+def measure(command, runs):
+    best = None
+    for _ in range(runs):
+        began = time.perf_counter()
+        subprocess.run(command, cwd=API_DIR, check=True, stdout=subprocess.DEVNULL)
+        elapsed = time.perf_counter() - began
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    args = get_args()
+    over_budget = False
+    print('{:<22} {:>10} {:>10}'.format('script', 'import (s)', '--help (s)'))
+    for script in SCRIPTS:
+        # importing must not load requests, which is only needed once logs are fetched
+        check = 'import sys, {}; assert "requests" not in sys.modules, "requests imported at startup"'.format(script)
+        import_seconds = measure([sys.executable, '-c', check], args.runs)
+        help_seconds = measure([sys.executable, script + '.py', '--help'], args.runs)
+        print('{:<22} {:>10.3f} {:>10.3f}'.format(script, import_seconds, help_seconds))
+        over_budget = over_budget or max(import_seconds, help_seconds) > args.budget
+    if over_budget:
+        sys.exit('Startup is over the {:.2f}s budget'.format(args.budget))
+
+
+if __name__ == '__main__':
+    main()
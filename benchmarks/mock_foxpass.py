@@ -0,0 +1,550 @@
+#!/usr/bin/env python3
+
+"""
+Local mock of the Foxpass API, used to benchmark and try out the scripts in api/ without touching production.
+
+It serves the endpoints of api/postman_collection/foxpass-postman.json: /v1/users/ with their ssh
+keys, /v1/groups/, their members and memberships, /v1/my/sshkeys/, /v1/hostgroups/ with their user
+and group members, /v1/sudoers/ with their users and groups, /v1/mac_entries/ with their prefixes,
+/v1/whitelist_ips/ and the log endpoints (/v1/logs/ldap/, /v1/logs/event/ and /v1/logs/radius/).
+Everything is kept in memory and can be created, changed and deleted. LDAP binders and
+/v1/authn/ and /v1/authz/ are not served. List responses carry an ETag, and with
+--directory-page-size the user, group and member lists are paged with numPages like the logs.
+
+Log records are generated on the fly, evenly spaced over the last --log-days days, so any window
+can be requested with the same numPages paging as the real API without holding the records in memory.
+
+The directory can be seeded with --users and --groups, from a file written by
+foxpass_dummy_data.py --output with --fixture, or by running foxpass_dummy_data.py against the mock.
+
+With --rate-limit the mock throttles like the real API: requests over the limit are answered with
+429 and a Retry-After header. --throttle-rate and --error-rate answer that share of requests with a
+429 or a 503 at random, and --latency delays every answer.
+
+No external packages are required.
+
+To run:
+python mock_foxpass.py --port 8000 --users 10000 --groups 500 --log-records 100000 --latency 0.05 --rate-limit 20
+python ../api/foxpass_dummy_data.py --api-key test --api-url http://localhost:8000/v1/ --user-domain example.com --user-count 1000 --group-count 50 --yes
+
+Then point a script at it, e.g. python foxpass_list_users.py --api-key test --api-url http://localhost:8000/v1/
+"""
+
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import json
+import math
+import random
+import threading
+import time
+import urllib.parse
+
+PAGE_SIZE = 100
+FIRST_UID = 20000
+FIRST_GID = 30000
+USER_DEFAULTS = {
+    'is_active': True,
+    'active': True,
+    'is_eng_user': False,
+    'is_posix_user': False,
+    'is_company_admin': False,
+    'is_service_account': False,
+}
+LOG_KINDS = ('ldap', 'event', 'radius')
+# {resource: (fields a PUT may change, {member list: (field naming the member, resource it must exist in)})}
+NAMED_RESOURCES = {
+    'hostgroups': (('all_users', 'rules'), {'user_members': ('username', 'users'), 'group_members': ('groupname', 'groups')}),
+    'sudoers': ((), {'users': ('username', 'users'), 'groups': ('groupname', 'groups')}),
+    'mac_entries': ((), {'prefixes': ('prefix', None)}),
+}
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+WINDOW_FORMAT = '%Y-%m-%dT%H:%MZ'
+
+
+class MockFoxpass:
+    def __init__(self, log_records=10000, log_days=7, latency=0.0, page_size=PAGE_SIZE, rate_limit=None,
+                 error_rate=0.0, throttle_rate=0.0, directory_page_size=None, seed=0):
+        self.log_records = log_records
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.random = random.Random(seed)
+        self.directory_page_size = directory_page_size
+        self.users = {}
+        self.groups = {}
+        # {group name: set of usernames}
+        self.members = {}
+        self.whitelist_ips = {}
+        # {username: {key name: key}}, and the keys of the user the API token belongs to
+        self.sshkeys = {}
+        self.my_sshkeys = {}
+        # {resource: {name: record}} and {resource: {name: {member list: {member: entry}}}}
+        self.named = {resource: {} for resource in NAMED_RESOURCES}
+        self.named_members = {resource: {} for resource in NAMED_RESOURCES}
+        self.next_uid = FIRST_UID
+        self.next_gid = FIRST_GID
+        # bumped on every change, it is the ETag of the lists
+        self.version = 0
+        self.tokens = rate_limit or 0
+        self.refilled = time.monotonic()
+        self.throttled = 0
+        self.page_size = page_size
+        self.end = datetime.now(timezone.utc).replace(microsecond=0)
+        self.start = self.end - timedelta(days=log_days)
+        self.step = (self.end - self.start).total_seconds() / max(1, log_records)
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def count_request(self):
+        with self.lock:
+            self.requests += 1
+
+    # Token bucket over all clients, returns False when the request should get a 429
+    def admit(self):
+        if not self.rate_limit:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate_limit, self.tokens + (now - self.refilled) * self.rate_limit)
+            self.refilled = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            self.throttled += 1
+            return False
+
+    # Returns the injected failure for a request as (status, payload, headers), or None
+    def inject(self):
+        if not self.admit():
+            return 429, error('Rate limited'), {'Retry-After': '1'}
+        with self.lock:
+            draw = self.random.random()
+            if draw < self.throttle_rate:
+                self.throttled += 1
+                return 429, error('Rate limited'), {'Retry-After': '1'}
+            if draw < self.throttle_rate + self.error_rate:
+                return 503, error('Service unavailable'), {}
+        return None
+
+    # Returns the index range [lo, hi) of the records that fall inside the window
+    def window(self, start, end):
+        lo, hi = 0, self.log_records
+        if start:
+            offset = (parse_window(start) - self.start).total_seconds()
+            lo = min(hi, max(0, math.ceil(offset / self.step)))
+        if end:
+            # the window is inclusive of its last minute
+            offset = (parse_window(end) + timedelta(minutes=1) - self.start).total_seconds()
+            hi = min(hi, max(lo, math.ceil(offset / self.step)))
+        return lo, hi
+
+    def log_record(self, kind, i):
+        timestamp = (self.start + timedelta(seconds=i * self.step)).strftime(TIMESTAMP_FORMAT)
+        success = i % 7 != 0
+        if kind == 'ldap':
+            return {
+                'id': i,
+                'timestamp': timestamp,
+                'bindDn': 'uid=user{},ou=people,dc=example,dc=com'.format(i % 500),
+                'type': ('bind', 'search', 'compare')[i % 3],
+                'success': 1 if success else 0,
+                'message': 'ok' if success else 'invalid credentials',
+            }
+        if kind == 'radius':
+            return {
+                'id': i,
+                'timestamp': timestamp,
+                'username': 'user{}'.format(i % 500),
+                'ipAddress': '10.0.{}.{}'.format(i % 4, i % 250),
+                'message': 'Access-Accept' if success else 'Access-Reject',
+                'success': success,
+            }
+        return {
+            'id': i,
+            'timestamp': timestamp,
+            'event_type': ('login', 'logout', 'password_change', 'mfa')[i % 4],
+            'data': {'username': 'user{}'.format(i % 500)},
+        }
+
+    def logs(self, kind, body):
+        lo, hi = self.window(body.get('from'), body.get('to'))
+        num_pages = math.ceil((hi - lo) / self.page_size)
+        page = body.get('page', 1)
+        first = lo + (page - 1) * self.page_size
+        if body.get('ascending'):
+            indexes = range(first, min(hi, first + self.page_size))
+        else:
+            last = hi - (page - 1) * self.page_size
+            indexes = range(last - 1, max(lo, last - self.page_size) - 1, -1)
+        return {'data': [self.log_record(kind, i) for i in indexes], 'numPages': num_pages}
+
+    # Adds users and groups directly, each user joins `memberships` random groups
+    def populate(self, users=0, groups=0, memberships=1):
+        with self.lock:
+            group_names = ['group{}'.format(i) for i in range(groups)]
+            for name in group_names:
+                self.create_group({'name': name, 'is_posix_group': True})
+            for i in range(users):
+                username = 'user{}'.format(i)
+                self.create_user({'username': username, 'email': username + '@example.com'})
+                for name in self.random.sample(group_names, min(memberships, groups)):
+                    self.members[name].add(username)
+
+    # Sends every request of a file written by foxpass_dummy_data.py --output to the mock
+    def load_fixture(self, path):
+        with open(path) as f:
+            for line in f:
+                request = json.loads(line)
+                self.handle(request['method'], '/v1/' + request['endpoint'], request['data'])
+
+    def create_user(self, data):
+        user = dict(USER_DEFAULTS, uid=self.next_uid, custom_fields={})
+        user.update(data)
+        self.next_uid += 1
+        self.users[user['username']] = user
+        return user
+
+    def create_group(self, data):
+        group = {'gid': self.next_gid, 'is_posix_group': False}
+        group.update(data)
+        self.next_gid += 1
+        self.groups[group['name']] = group
+        self.members[group['name']] = set()
+        return group
+
+    def update_user(self, user, data):
+        data = dict(data)
+        user.get('custom_fields', {}).update(data.pop('custom_fields', {}))
+        user.update(data)
+        if 'is_active' in data:
+            user['active'] = data['is_active']
+
+    # Returns a list answer, paged like the logs when directory_page_size is set
+    def list_page(self, items, query):
+        if not self.directory_page_size:
+            return ok(items)
+        page = int(query.get('page', ['1'])[0])
+        start = (page - 1) * self.directory_page_size
+        payload = ok(items[start:start + self.directory_page_size])
+        payload['numPages'] = max(1, math.ceil(len(items) / self.directory_page_size))
+        return payload
+
+    # Answers a request as (status, payload, headers). path is the full path, e.g. /v1/users/?page=2
+    def handle(self, method, path, body=None, headers=None):
+        url = urllib.parse.urlsplit(path)
+        parts = [part for part in url.path.split('/') if part]
+        query = urllib.parse.parse_qs(url.query)
+        if not parts or parts[0] != 'v1':
+            return 404, error('Not found'), {}
+        parts = parts[1:]
+        if parts[:1] == ['logs'] and len(parts) == 2 and parts[1] in LOG_KINDS and method == 'POST':
+            return 200, self.logs(parts[1], body or {}), {}
+        with self.lock:
+            if method == 'GET' and len(parts) == 1 and (headers or {}).get('If-None-Match') == self.etag():
+                return 304, None, {'ETag': self.etag()}
+            status, payload = self.route(method, parts, body or {}, query)
+            if method != 'GET' and status == 200:
+                self.version += 1
+            return status, payload, {'ETag': self.etag()} if method == 'GET' else {}
+
+    def etag(self):
+        return '"{}"'.format(self.version)
+
+    def route(self, method, parts, body, query):
+        resource, name, sub, item = (parts + [None] * 4)[:4]
+        if len(parts) > 4:
+            return 404, error('Not found')
+        if resource == 'users':
+            return self.route_users(method, name, sub, item, body, query)
+        if resource == 'groups':
+            return self.route_groups(method, name, sub, item, body, query)
+        if resource == 'whitelist_ips' and sub is None:
+            return self.route_whitelist_ips(method, name, body)
+        if resource in NAMED_RESOURCES:
+            return self.route_named(resource, method, name, sub, item, body)
+        if resource == 'my' and name == 'sshkeys' and sub is None and method in ('GET', 'POST'):
+            return self.route_records(method, self.my_sshkeys, None, body, ('is_active',))
+        return 404, error('Not found')
+
+    def route_users(self, method, name, sub, item, body, query):
+        if name is None:
+            if method == 'GET':
+                return 200, self.list_page(list(self.users.values()), query)
+            if method == 'POST':
+                if not body.get('username') or not body.get('email'):
+                    return 400, error('username and email are required')
+                if body['username'] in self.users:
+                    return 400, error('User {} already exists'.format(body['username']))
+                return 200, ok(self.create_user({'username': body['username'], 'email': body['email']}))
+            return 405, error('Method not allowed')
+        user = self.users.get(name)
+        if user is None:
+            return 404, error('No such user')
+        if sub is None:
+            if method == 'GET':
+                return 200, ok(user)
+            if method == 'PUT':
+                self.update_user(user, body)
+                return 200, ok(user)
+            if method == 'DELETE':
+                del self.users[name]
+                self.sshkeys.pop(name, None)
+                for members in self.members.values():
+                    members.discard(name)
+                return 200, ok(None)
+            return 405, error('Method not allowed')
+        if sub == 'sshkeys':
+            return self.route_records(method, self.sshkeys.setdefault(name, {}), item, body, ('is_active',))
+        if sub != 'groups':
+            return 404, error('Not found')
+        if item is None:
+            if method == 'GET':
+                return 200, ok([{'name': group} for group, members in self.members.items() if name in members])
+            if method == 'POST':
+                return self.add_member(body.get('name'), name)
+            return 405, error('Method not allowed')
+        return self.member(method, item, name)
+
+    def route_groups(self, method, name, sub, item, body, query):
+        if name is None:
+            if method == 'GET':
+                return 200, self.list_page(list(self.groups.values()), query)
+            if method == 'POST':
+                if not body.get('name'):
+                    return 400, error('name is required')
+                if body['name'] in self.groups:
+                    return 400, error('Group {} already exists'.format(body['name']))
+                return 200, ok(self.create_group(body))
+            return 405, error('Method not allowed')
+        group = self.groups.get(name)
+        if group is None:
+            return 404, error('No such group')
+        if sub is None:
+            if method == 'GET':
+                return 200, ok(group)
+            if method == 'DELETE':
+                del self.groups[name]
+                del self.members[name]
+                return 200, ok(None)
+            return 405, error('Method not allowed')
+        if sub != 'members':
+            return 404, error('Not found')
+        if item is None:
+            if method == 'GET':
+                return 200, self.list_page([{'username': username} for username in sorted(self.members[name])], query)
+            if method == 'POST':
+                return self.add_member(name, body.get('username'))
+            return 405, error('Method not allowed')
+        return self.member(method, name, item)
+
+    def add_member(self, group, username):
+        if group not in self.groups or username not in self.users:
+            return 404, error('No such user or group')
+        self.members[group].add(username)
+        return 200, ok(None)
+
+    # Checks or removes one membership
+    def member(self, method, group, username):
+        if group not in self.groups or username not in self.members[group]:
+            return 404, error('Not a member')
+        if method == 'GET':
+            return 200, ok({'name': group, 'username': username})
+        if method == 'DELETE':
+            self.members[group].discard(username)
+            return 200, ok(None)
+        return 405, error('Method not allowed')
+
+    # Serves a list of records keyed by name: list and create them, read, change `fields` of or delete one
+    def route_records(self, method, records, name, body, fields, on_create=None, on_delete=None):
+        if name is None:
+            if method == 'GET':
+                return 200, ok(list(records.values()))
+            if method == 'POST':
+                if not body.get('name'):
+                    return 400, error('name is required')
+                if body['name'] in records:
+                    return 400, error('{} already exists'.format(body['name']))
+                records[body['name']] = dict(body)
+                if on_create:
+                    on_create(body['name'])
+                return 200, ok(records[body['name']])
+            return 405, error('Method not allowed')
+        record = records.get(name)
+        if record is None:
+            return 404, error('Not found')
+        if method == 'GET':
+            return 200, ok(record)
+        if method == 'PUT':
+            record.update((key, body[key]) for key in fields if key in body)
+            return 200, ok(record)
+        if method == 'DELETE':
+            del records[name]
+            if on_delete:
+                on_delete(name)
+            return 200, ok(None)
+        return 405, error('Method not allowed')
+
+    # Serves host groups, sudoers and MAC entries along with their member lists
+    def route_named(self, resource, method, name, sub, item, body):
+        fields, member_lists = NAMED_RESOURCES[resource]
+        members = self.named_members[resource]
+        if sub is None:
+            def on_create(name):
+                members[name] = {key: {} for key in member_lists}
+            return self.route_records(method, self.named[resource], name, body, fields, on_create, members.pop)
+        if name not in members or sub not in member_lists:
+            return 404, error('Not found')
+        field, exists_in = member_lists[sub]
+        entries = members[name][sub]
+        if item is None:
+            if method == 'GET':
+                return 200, ok(list(entries.values()))
+            # MAC prefixes are added with a PUT on the list, everything else with a POST
+            if method in ('POST', 'PUT'):
+                member = body.get(field)
+                if not member or (exists_in and member not in getattr(self, exists_in)):
+                    return 404, error('No such {}'.format(field))
+                entries[member] = dict(body)
+                return 200, ok(entries[member])
+            return 405, error('Method not allowed')
+        if item not in entries:
+            return 404, error('Not a member')
+        if method == 'GET':
+            return 200, ok(entries[item])
+        if method == 'DELETE':
+            del entries[item]
+            return 200, ok(None)
+        return 405, error('Method not allowed')
+
+    def route_whitelist_ips(self, method, name, body):
+        if name is None:
+            if method == 'GET':
+                return 200, ok(list(self.whitelist_ips.values()))
+            if method == 'POST':
+                if not body.get('name') or not body.get('ip_address'):
+                    return 400, error('name and ip_address are required')
+                entry = {'name': body['name'], 'ip_address': body['ip_address'],
+                         'end_ip_address': body.get('end_ip_address', body['ip_address']), 'enabled': True}
+                self.whitelist_ips[entry['name']] = entry
+                return 200, ok(entry)
+            return 405, error('Method not allowed')
+        entry = self.whitelist_ips.get(name)
+        if entry is None:
+            return 404, error('No such entry')
+        if method == 'GET':
+            return 200, ok(entry)
+        if method == 'PUT':
+            entry.update((key, body[key]) for key in ('enabled',) if key in body)
+            return 200, ok(entry)
+        if method == 'DELETE':
+            del self.whitelist_ips[name]
+            return 200, ok(None)
+        return 405, error('Method not allowed')
+
+
+def ok(data):
+    return {'status': 'ok', 'data': data}
+
+
+def error(message):
+    return {'status': 'error', 'message': message}
+
+
+def parse_window(value):
+    return datetime.strptime(value, WINDOW_FORMAT).replace(tzinfo=timezone.utc)
+
+
+def make_handler(mock):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, status, payload, headers=None):
+            body = json.dumps(payload).encode() if payload is not None else b''
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def read_json(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            return json.loads(self.rfile.read(length) or b'{}')
+
+        def dispatch(self):
+            mock.count_request()
+            body = self.read_json()
+            failure = mock.inject()
+            if failure:
+                self.send_json(*failure)
+                return
+            if mock.latency:
+                time.sleep(mock.latency)
+            self.send_json(*mock.handle(self.command, self.path, body, self.headers))
+
+        do_GET = do_POST = do_PUT = do_DELETE = dispatch
+
+    return Handler
+
+
+# The default listen backlog of 5 resets connections when many benchmark workers connect at once
+class MockServer(ThreadingHTTPServer):
+    request_queue_size = 128
+    daemon_threads = True
+
+
+# Starts the mock on a background thread and returns the server, use port 0 to pick a free port
+def serve(mock, port=0):
+    server = MockServer(('127.0.0.1', port), make_handler(mock))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def base_url(server):
+    return 'http://127.0.0.1:{}/v1/'.format(server.server_address[1])
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Run a local mock of the Foxpass API')
+    parser.add_argument('--port', type=int, default=8000, help='Port to listen on')
+    parser.add_argument('--log-records', type=int, default=10000, help='Number of records per log type')
+    parser.add_argument('--log-days', type=int, default=7, help='How many days the log records are spread over')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds to sleep before answering each request')
+    parser.add_argument('--rate-limit', type=float, help='Requests per second allowed before answering 429')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Share of requests answered with 429 at random')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests answered with 503 at random')
+    parser.add_argument('--users', type=int, default=0, help='Number of users to start with')
+    parser.add_argument('--groups', type=int, default=0, help='Number of groups to start with')
+    parser.add_argument('--memberships-per-user', type=int, default=1, help='Number of groups each of those users is in')
+    parser.add_argument('--fixture', help='JSON lines file written by foxpass_dummy_data.py --output to load at start')
+    parser.add_argument('--directory-page-size', type=int, help='Page the user, group and member lists with this many records per page')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for memberships and injected failures')
+    return parser.parse_args()
+
+
+def main():
+    args = get_args()
+    mock = MockFoxpass(args.log_records, args.log_days, args.latency, rate_limit=args.rate_limit,
+                       error_rate=args.error_rate, throttle_rate=args.throttle_rate,
+                       directory_page_size=args.directory_page_size, seed=args.seed)
+    mock.populate(args.users, args.groups, args.memberships_per_user)
+    if args.fixture:
+        mock.load_fixture(args.fixture)
+    server = serve(mock, args.port)
+    print('Mock Foxpass API listening on {}'.format(base_url(server)))
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -2,7 +2,7 @@
 
 ARGS_NR=$#
 
-ACTIONS=$(find . | xargs | sed 's/\.\/foxpass_//gi' | sed 's/\.py//gi' | sed 's/\. //gi' | sed 's/\.\/api\.sh //gi')
+ACTIONS=$(find . -name 'foxpass_*.py' | sort | xargs | sed 's/\.\/foxpass_//gi' | sed 's/\.py//gi')
 
 if [ $ARGS_NR -lt 1 ]; then
   >&2 echo "ERROR: Invalid number of arguments."